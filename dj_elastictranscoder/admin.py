@@ -1,7 +1,17 @@
 from django.contrib import admin
-from .models import EncodeJob
+from .models import EncodeJob, EncodeOutput, EncodeRequest
+
+class EncodeOutputInline(admin.TabularInline):
+    model = EncodeOutput
+    extra = 0
 
 class EncodeJobAdmin(admin.ModelAdmin):
     list_display = ('id', 'state', 'message')
     list_filters = ('state',)
+    inlines = [EncodeOutputInline]
 admin.site.register(EncodeJob, EncodeJobAdmin)
+
+class EncodeRequestAdmin(admin.ModelAdmin):
+    list_display = ('id', 'pipeline_id', 'state', 'attempts', 'job', 'error')
+    list_filters = ('state',)
+admin.site.register(EncodeRequest, EncodeRequestAdmin)
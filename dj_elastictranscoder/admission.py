@@ -0,0 +1,121 @@
+import threading
+import time
+from functools import wraps
+
+from django.conf import settings
+from django.http import HttpResponse
+
+
+class AdmissionController(object):
+    """
+    Cap the number of requests handled at once and refuse new ones while the
+    handling time, an exponentially weighted moving average dominated by the
+    database, is over ``max_latency`` seconds.  Once the average goes over the
+    limit requests are refused for ``retry_after`` seconds, after which they
+    are let through again to measure the database.
+    """
+    def __init__(self, max_inflight=None, max_latency=None, retry_after=5, alpha=0.2, clock=time.time):
+        self.max_inflight = max_inflight
+        self.max_latency = max_latency
+        self.retry_after = retry_after
+        self.alpha = alpha
+        self.clock = clock
+
+        self.inflight = 0
+        self.latency = None
+        self.open_until = None
+        self.admitted = 0
+        self.shed = 0
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        """
+        Return True and count the request as in flight if it may be handled
+        """
+        with self.lock:
+            overloaded = self.open_until is not None and self.clock() < self.open_until
+            if not overloaded and self.max_inflight is not None:
+                overloaded = self.inflight >= self.max_inflight
+
+            if overloaded:
+                self.shed += 1
+                return False
+
+            self.inflight += 1
+            self.admitted += 1
+            return True
+
+    def release(self, latency):
+        with self.lock:
+            self.inflight -= 1
+            if self.latency is None:
+                self.latency = latency
+            else:
+                self.latency += self.alpha * (latency - self.latency)
+
+            if self.max_latency is not None and self.latency > self.max_latency:
+                self.open_until = self.clock() + self.retry_after
+
+    def stats(self):
+        with self.lock:
+            return {
+                'admitted': self.admitted,
+                'shed': self.shed,
+                'inflight': self.inflight,
+                'latency': self.latency,
+            }
+
+
+_controller = None
+_controller_lock = threading.Lock()
+
+
+def get_controller():
+    """
+    Return the controller shared by the process, configured with
+    ELASTIC_TRANSCODER_MAX_INFLIGHT, ELASTIC_TRANSCODER_MAX_DB_LATENCY and
+    ELASTIC_TRANSCODER_RETRY_AFTER
+    """
+    global _controller
+    with _controller_lock:
+        if _controller is None:
+            _controller = AdmissionController(
+                max_inflight=getattr(settings, 'ELASTIC_TRANSCODER_MAX_INFLIGHT', None),
+                max_latency=getattr(settings, 'ELASTIC_TRANSCODER_MAX_DB_LATENCY', None),
+                retry_after=getattr(settings, 'ELASTIC_TRANSCODER_RETRY_AFTER', 5))
+        return _controller
+
+
+def reset_controller():
+    global _controller
+    with _controller_lock:
+        _controller = None
+
+
+def stats():
+    """
+    Admitted and shed request counts, requests in flight and the average
+    handling time of this process, for monitoring
+    """
+    return get_controller().stats()
+
+
+def admission_control(view):
+    """
+    Answer 503 with a Retry-After header, before the request body is read,
+    when the controller refuses the request.  SNS delivers it again later.
+    """
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        controller = get_controller()
+        if not controller.acquire():
+            response = HttpResponse('Overloaded', status=503)
+            response['Retry-After'] = str(int(controller.retry_after))
+            return response
+
+        start = time.time()
+        try:
+            return view(request, *args, **kwargs)
+        finally:
+            controller.release(time.time() - start)
+    return wrapper
@@ -0,0 +1,182 @@
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+
+from .metadata import InvalidEncodeRequest
+from .ratelimit import is_throttling_error
+
+
+class CircuitOpenError(Exception):
+    """
+    Raised instead of calling AWS while the circuit of a service is open
+    """
+    pass
+
+
+def is_client_error(e):
+    """
+    Errors caused by the request itself rather than by the service
+    """
+    if isinstance(e, InvalidEncodeRequest):
+        return True
+    status = getattr(e, 'status', None)
+    return isinstance(status, int) and 400 <= status < 500 and status != 429
+
+
+class CircuitBreaker(object):
+    """
+    Fail fast while a service keeps failing.
+
+    After ``failure_threshold`` consecutive failures the circuit opens and
+    calls raise ``CircuitOpenError`` without reaching AWS.  Once
+    ``open_interval`` seconds have passed a single probe call is let through:
+    if it succeeds the circuit closes again, otherwise it stays open for
+    another interval.  Client errors and throttling do not count as failures.
+
+    The state is shared by every thread of the process.
+    """
+    CLOSED = 'closed'
+    OPEN = 'open'
+    HALF_OPEN = 'half-open'
+
+    def __init__(self, name, failure_threshold=5, open_interval=30, clock=time.time):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.open_interval = open_interval
+        self.clock = clock
+
+        self.failures = 0
+        self.opened_at = None
+        self.probing = False
+        self.lock = threading.Lock()
+
+    @property
+    def state(self):
+        opened_at = self.get_opened_at()
+        if opened_at is None:
+            return self.CLOSED
+        if self.clock() - opened_at < self.open_interval:
+            return self.OPEN
+        return self.HALF_OPEN
+
+    def get_opened_at(self):
+        return self.opened_at
+
+    def before_call(self):
+        """
+        Raise ``CircuitOpenError`` unless the call may go through, returns
+        True when the call is the half-open probe
+        """
+        with self.lock:
+            state = self.state
+            if state == self.CLOSED:
+                return False
+            if state == self.HALF_OPEN and self.start_probe():
+                return True
+        raise CircuitOpenError('Circuit "%s" is open' % self.name)
+
+    def start_probe(self):
+        if self.probing:
+            return False
+        self.probing = True
+        return True
+
+    def on_success(self, probe):
+        with self.lock:
+            self.failures = 0
+            self.opened_at = None
+            if probe:
+                self.probing = False
+
+    def on_failure(self, probe):
+        with self.lock:
+            self.failures += 1
+            if probe or self.failures >= self.failure_threshold:
+                self.opened_at = self.clock()
+            if probe:
+                self.probing = False
+
+    def call(self, func, *args, **kwargs):
+        if not self.failure_threshold:
+            return func(*args, **kwargs)
+
+        probe = self.before_call()
+        try:
+            result = func(*args, **kwargs)
+        except Exception as e:
+            if is_client_error(e) or is_throttling_error(e):
+                self.on_success(probe)
+            else:
+                self.on_failure(probe)
+            raise
+
+        self.on_success(probe)
+        return result
+
+
+class CacheCircuitBreaker(CircuitBreaker):
+    """
+    ``CircuitBreaker`` keeping its state in a Django cache so every process
+    using that cache shares it
+    """
+    def __init__(self, name, cache, **kwargs):
+        super(CacheCircuitBreaker, self).__init__(name, **kwargs)
+        self.cache = cache
+        self.prefix = 'dj_elastictranscoder:breaker:%s' % name
+
+    def get_opened_at(self):
+        return self.cache.get('%s:opened' % self.prefix)
+
+    def start_probe(self):
+        return self.cache.add('%s:probe' % self.prefix, True, self.open_interval)
+
+    def on_success(self, probe):
+        self.cache.delete_many(['%s:failures' % self.prefix, '%s:opened' % self.prefix])
+        if probe:
+            self.cache.delete('%s:probe' % self.prefix)
+
+    def on_failure(self, probe):
+        key = '%s:failures' % self.prefix
+        self.cache.add(key, 0)
+        failures = self.cache.incr(key)
+        if probe or failures >= self.failure_threshold:
+            self.cache.set('%s:opened' % self.prefix, self.clock(), None)
+        if probe:
+            self.cache.delete('%s:probe' % self.prefix)
+
+
+_breakers = {}
+_breakers_lock = threading.Lock()
+
+
+def get_breaker(name):
+    """
+    Return the breaker shared by the process for ``name``, configured with
+    ELASTIC_TRANSCODER_BREAKER_THRESHOLD, ELASTIC_TRANSCODER_BREAKER_INTERVAL and,
+    to share the state between processes, ELASTIC_TRANSCODER_BREAKER_CACHE
+    """
+    with _breakers_lock:
+        try:
+            return _breakers[name]
+        except KeyError:
+            pass
+
+        kwargs = {
+            'failure_threshold': getattr(settings, 'ELASTIC_TRANSCODER_BREAKER_THRESHOLD', 5),
+            'open_interval': getattr(settings, 'ELASTIC_TRANSCODER_BREAKER_INTERVAL', 30),
+        }
+        cache = getattr(settings, 'ELASTIC_TRANSCODER_BREAKER_CACHE', None)
+        if cache:
+            breaker = CacheCircuitBreaker(name, caches[cache], **kwargs)
+        else:
+            breaker = CircuitBreaker(name, **kwargs)
+
+        _breakers[name] = breaker
+        return breaker
+
+
+def reset_breakers():
+    with _breakers_lock:
+        _breakers.clear()
@@ -0,0 +1,126 @@
+import logging
+import random
+import threading
+from datetime import timedelta
+from urllib2 import urlopen
+
+from django.conf import settings
+from django.core.mail import mail_admins
+from django.db import connection
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+from .models import PendingConfirmation
+
+logger = logging.getLogger("dj_elastictranscoder.confirmations")
+
+
+def fetch(url):
+    """
+    Default confirmation fetcher, visits the SubscribeURL
+    """
+    urlopen(url, timeout=getattr(settings, 'ELASTIC_TRANSCODER_CONFIRMATION_TIMEOUT', 10)).read()
+
+
+def get_fetcher():
+    return import_string(getattr(settings, 'ELASTIC_TRANSCODER_CONFIRMATION_FETCHER',
+                                 'dj_elastictranscoder.confirmations.fetch'))
+
+
+def notify_admins(subscribe_url):
+    subscribe_body = """
+    This message serves as a fail-safe in case the automatic subscription confirmation fails.
+
+    Please visit this URL below to confirm your subscription with SNS
+
+    %s """ % subscribe_url
+
+    mail_admins('Please confirm SNS subscription', subscribe_body)
+
+
+def backoff(attempts):
+    """
+    Seconds to wait before retrying after ``attempts`` failed attempts
+    """
+    delay = min(3600, 30 * 2 ** (attempts - 1))
+    return random.uniform(delay / 2.0, delay)
+
+
+def confirm(pk, subscribe_url, attempts):
+    """
+    Visit the SubscribeURL and record the outcome on the PendingConfirmation
+    """
+    try:
+        get_fetcher()(subscribe_url)
+    except Exception as e:
+        logger.warning("Confirming the SNS subscription failed: %s", e)
+        attempts += 1
+        PendingConfirmation.objects.filter(pk=pk, confirmed_at__isnull=True).update(
+            attempts=attempts,
+            next_attempt_at=timezone.now() + timedelta(seconds=backoff(attempts)),
+            error='%s: %s' % (e.__class__.__name__, e))
+        return False
+
+    PendingConfirmation.objects.filter(pk=pk).update(
+        attempts=attempts + 1, confirmed_at=timezone.now(), error='')
+    return True
+
+
+def _confirm_in_background(pk, subscribe_url):
+    try:
+        notify_admins(subscribe_url)
+        confirm(pk, subscribe_url, 0)
+    except Exception:
+        logger.exception("Confirming the SNS subscription in the background failed")
+    finally:
+        connection.close()
+
+
+def add_confirmation(data):
+    """
+    Record a SubscriptionConfirmation and, unless
+    ELASTIC_TRANSCODER_CONFIRM_IN_BACKGROUND is False, start confirming it on
+    a background thread.  Confirmations that fail are retried with backoff by
+    the ``confirm_encoder_subscriptions`` management command.
+    """
+    background = getattr(settings, 'ELASTIC_TRANSCODER_CONFIRM_IN_BACKGROUND', True)
+
+    # leave the background thread time to confirm before the command picks it up
+    next_attempt_at = timezone.now()
+    if background:
+        next_attempt_at += timedelta(seconds=backoff(1))
+
+    confirmation = PendingConfirmation.objects.create(
+        topic_arn=data.get('TopicArn', ''),
+        subscribe_url=data['SubscribeURL'],
+        next_attempt_at=next_attempt_at)
+
+    if background:
+        thread = threading.Thread(target=_confirm_in_background, args=(confirmation.pk, confirmation.subscribe_url))
+        thread.daemon = True
+        thread.start()
+
+    return confirmation
+
+
+def confirm_pending(max_attempts=10):
+    """
+    Confirm the subscriptions that are due, returning ``(confirmed, failed)``
+    """
+    confirmed = failed = 0
+
+    pending = PendingConfirmation.objects.filter(
+        confirmed_at__isnull=True,
+        attempts__lt=max_attempts,
+        next_attempt_at__lte=timezone.now())
+
+    for confirmation in pending:
+        if not confirmation.attempts:
+            notify_admins(confirmation.subscribe_url)
+
+        if confirm(confirmation.pk, confirmation.subscribe_url, confirmation.attempts):
+            confirmed += 1
+        else:
+            failed += 1
+
+    return confirmed, failed
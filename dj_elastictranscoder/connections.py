@@ -0,0 +1,94 @@
+import threading
+import time
+from importlib import import_module
+
+import boto
+
+from django.conf import settings
+
+
+def connect(service, region=None, access_key_id=None, secret_access_key=None):
+    """
+    Create a new boto connection for ``service`` (e.g. 'elastictranscoder', 'sns')
+    """
+    if region:
+        module = import_module('boto.%s' % service)
+        connection = module.connect_to_region(
+            region,
+            aws_access_key_id=access_key_id,
+            aws_secret_access_key=secret_access_key)
+        if connection is None:
+            raise ValueError('Invalid region "%s" for service "%s"' % (region, service))
+        return connection
+
+    connect_service = getattr(boto, 'connect_%s' % service)
+    return connect_service(access_key_id, secret_access_key)
+
+
+class ConnectionPool(object):
+    """
+    Process wide cache of boto connections keyed by service, region and credentials.
+
+    boto connections keep their own pool of HTTP connections, so reusing the
+    connection object also reuses the underlying TCP/TLS sessions.  Entries that
+    have not been used for ``idle_timeout`` seconds are closed and evicted.
+    """
+    def __init__(self, factory=connect, idle_timeout=None):
+        self.factory = factory
+        self.idle_timeout = idle_timeout
+        self.connections = {}
+        self.lock = threading.Lock()
+
+    def get_idle_timeout(self):
+        if self.idle_timeout is not None:
+            return self.idle_timeout
+        return getattr(settings, 'ELASTIC_TRANSCODER_CONNECTION_IDLE_TIMEOUT', 300)
+
+    def get(self, service, region=None, access_key_id=None, secret_access_key=None):
+        key = (service, region, access_key_id, secret_access_key)
+        now = time.time()
+
+        with self.lock:
+            self._evict(now)
+            try:
+                connection, last_used = self.connections[key]
+            except KeyError:
+                connection = self.factory(service, region, access_key_id, secret_access_key)
+            self.connections[key] = (connection, now)
+
+        return connection
+
+    def _evict(self, now):
+        idle_timeout = self.get_idle_timeout()
+        if not idle_timeout:
+            return
+
+        for key, (connection, last_used) in list(self.connections.items()):
+            if now - last_used > idle_timeout:
+                del self.connections[key]
+                connection.close()
+
+    def close(self):
+        """
+        Close and forget every cached connection
+        """
+        with self.lock:
+            connections = [c for c, last_used in self.connections.values()]
+            self.connections.clear()
+
+        for connection in connections:
+            connection.close()
+
+    def __len__(self):
+        return len(self.connections)
+
+
+pool = ConnectionPool()
+
+
+def get_connection(service, region=None, access_key_id=None, secret_access_key=None):
+    return pool.get(service, region, access_key_id, secret_access_key)
+
+
+def close():
+    pool.close()
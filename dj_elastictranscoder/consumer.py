@@ -0,0 +1,114 @@
+import json
+import logging
+import threading
+
+from boto.sqs.message import RawMessage
+from django.conf import settings
+from django.db import connection, transaction
+
+from .connections import get_connection
+from .models import ArchivedNotification
+from .notifications import is_job_notification, notify_all, update_jobs
+
+logger = logging.getLogger("dj_elastictranscoder.consumer")
+
+
+def get_queue(name, region=None, access_key_id=None, secret_access_key=None):
+    """
+    SQS queue ``name``, reading message bodies as sent by SNS
+    """
+    queue = get_connection('sqs', region, access_key_id, secret_access_key).get_queue(name)
+    if queue is None:
+        raise ValueError('SQS queue "%s" does not exist' % name)
+    queue.set_message_class(RawMessage)
+    return queue
+
+
+def decode(body):
+    """
+    Return ``(message_id, raw notification, notification)`` from an SQS
+    message body, which is the SNS envelope unless the subscription uses raw
+    message delivery.  Raises ValueError for anything but a job notification.
+    """
+    data = json.loads(body)
+    if isinstance(data, dict) and data.get('Type') == 'Notification':
+        message_id, raw = data.get('MessageId', ''), data.get('Message')
+        message = json.loads(raw) if isinstance(raw, basestring) else None
+    else:
+        message_id, raw, message = '', body, data
+
+    if not is_job_notification(message):
+        raise ValueError('Not a job notification')
+    return message_id, raw, message
+
+
+def consume_once(queue, wait_time=20, visibility_timeout=None):
+    """
+    Receive up to 10 notifications (waiting up to ``wait_time`` seconds for
+    one), apply them in a batch and delete them from the queue.  Notifications
+    for jobs that do not exist yet are left in the queue to be received again
+    after the visibility timeout.  The signals are sent once the batch is
+    committed and deleted, so a failing receiver does not bring it back.
+    Returns the number of messages received.
+    """
+    received = queue.get_messages(num_messages=10, wait_time_seconds=wait_time, visibility_timeout=visibility_timeout)
+    if not received:
+        return 0
+
+    done = []
+    signals = []
+    notifications = []
+    for sqs_message in received:
+        try:
+            notifications.append((sqs_message,) + decode(sqs_message.get_body()))
+        except ValueError:
+            logger.error("Deleting SQS message that is not a job notification: '%s'", sqs_message.get_body())
+            done.append(sqs_message)
+
+    if notifications:
+        with transaction.atomic():
+            if getattr(settings, 'ELASTIC_TRANSCODER_ARCHIVE_NOTIFICATIONS', False):
+                ArchivedNotification.objects.bulk_create([
+                    ArchivedNotification(message_id=message_id, message=raw)
+                    for sqs_message, message_id, raw, message in notifications])
+
+            missing, signals = update_jobs([message for sqs_message, message_id, raw, message in notifications])
+
+        done.extend(sqs_message for sqs_message, message_id, raw, message in notifications
+                    if message['jobId'] not in missing)
+
+    if done:
+        queue.delete_message_batch(done)
+
+    notify_all(signals)
+    return len(received)
+
+
+def poll(queue, stop, wait_time=20, visibility_timeout=None):
+    """
+    Consume ``queue`` until the ``stop`` event is set
+    """
+    try:
+        while not stop.is_set():
+            try:
+                consume_once(queue, wait_time, visibility_timeout)
+            except Exception:
+                logger.exception("Consuming the notification queue failed")
+                stop.wait(wait_time)
+    finally:
+        connection.close()
+
+
+def start_pollers(queue, threads, wait_time=20, visibility_timeout=None):
+    """
+    Start ``threads`` daemon threads consuming ``queue``, returning the event
+    that stops them and the threads
+    """
+    stop = threading.Event()
+    pollers = []
+    for i in range(threads):
+        thread = threading.Thread(target=poll, args=(queue, stop, wait_time, visibility_timeout))
+        thread.daemon = True
+        thread.start()
+        pollers.append(thread)
+    return stop, pollers
@@ -0,0 +1,125 @@
+import threading
+import time
+
+from django.conf import settings
+from django.db.models import Count
+
+from .models import EncodeJob
+from .transcoder import Transcoder
+
+
+class Pipeline(object):
+    def __init__(self, id, weight=1, priority=0, max_active=None):
+        self.id = id
+        self.weight = weight
+        self.priority = priority
+        self.max_active = max_active
+
+
+class PipelineDispatcher(object):
+    """
+    Route jobs to the least loaded of several pipelines.
+
+    ``pipelines`` is a list of pipeline ids or of dicts with an ``id`` and
+    optional ``weight`` (share of the traffic), ``priority`` (lower is
+    preferred, higher priorities only get jobs once every lower one is full)
+    and ``max_active`` (pipeline is full once that many jobs are active).
+
+    The load of a pipeline is its number of active ``EncodeJob`` rows, counted
+    at most every ``refresh_interval`` seconds, plus the jobs this dispatcher
+    sent it since.
+    """
+    def __init__(self, pipelines=None, refresh_interval=None, transcoder_class=Transcoder, **transcoder_kwargs):
+        if pipelines is None:
+            pipelines = getattr(settings, 'ELASTIC_TRANSCODER_PIPELINES', [])
+        if refresh_interval is None:
+            refresh_interval = getattr(settings, 'ELASTIC_TRANSCODER_DISPATCH_REFRESH', 10)
+
+        self.pipelines = []
+        for pipeline in pipelines:
+            if not isinstance(pipeline, dict):
+                pipeline = {'id': pipeline}
+            self.pipelines.append(Pipeline(**pipeline))
+        assert self.pipelines, 'Please provide ELASTIC_TRANSCODER_PIPELINES'
+
+        self.refresh_interval = refresh_interval
+        self.transcoder_class = transcoder_class
+        self.transcoder_kwargs = transcoder_kwargs
+
+        self.active = {}
+        self.submitted = {}
+        self.refreshed = None
+        self.lock = threading.Lock()
+
+    def refresh(self):
+        ids = [p.id for p in self.pipelines]
+        rows = (EncodeJob.objects
+            .filter(state__in=EncodeJob.ACTIVE_STATES, pipeline_id__in=ids)
+            .values('pipeline_id')
+            .annotate(active=Count('pk')))
+        active = dict((row['pipeline_id'], row['active']) for row in rows)
+
+        with self.lock:
+            self.active = active
+            self.submitted = {}
+            self.refreshed = time.time()
+
+    def load(self, pipeline):
+        return self.active.get(pipeline.id, 0) + self.submitted.get(pipeline.id, 0)
+
+    def choose(self):
+        """
+        Pick a pipeline and count a job against it
+        """
+        if self.refreshed is None or time.time() - self.refreshed > self.refresh_interval:
+            self.refresh()
+
+        with self.lock:
+            eligible = [p for p in self.pipelines if p.max_active is None or self.load(p) < p.max_active]
+            if not eligible:
+                eligible = self.pipelines
+
+            priority = min(p.priority for p in eligible)
+            candidates = [p for p in eligible if p.priority == priority]
+            pipeline = min(candidates, key=lambda p: float(self.load(p)) / p.weight)
+
+            self.submitted[pipeline.id] = self.submitted.get(pipeline.id, 0) + 1
+
+        return pipeline
+
+    def release(self, pipeline):
+        with self.lock:
+            self.submitted[pipeline.id] = self.submitted.get(pipeline.id, 0) - 1
+
+    def get_transcoder(self, pipeline):
+        return self.transcoder_class(pipeline.id, **self.transcoder_kwargs)
+
+    def encode(self, input_name, outputs, playlists=None, **kwargs):
+        """
+        Encode on the least loaded pipeline and return the ``Transcoder`` used,
+        ready for ``create_job_for_object()``
+        """
+        pipeline = self.choose()
+        transcoder = self.get_transcoder(pipeline)
+        try:
+            transcoder.encode(input_name, outputs, playlists, **kwargs)
+        except Exception:
+            self.release(pipeline)
+            raise
+
+        return transcoder
+
+
+_dispatcher = None
+_dispatcher_lock = threading.Lock()
+
+
+def get_dispatcher():
+    """
+    Return the dispatcher for ELASTIC_TRANSCODER_PIPELINES shared by the process
+    """
+    global _dispatcher
+    with _dispatcher_lock:
+        if _dispatcher is None:
+            _dispatcher = PipelineDispatcher()
+        return _dispatcher
@@ -0,0 +1,179 @@
+import threading
+import time
+
+from django.conf import settings
+
+from .breaker import CircuitOpenError, is_client_error
+from .transcoder import Transcoder
+
+
+class RegionHealth(object):
+    """
+    Error rate and latency of a region as exponentially weighted moving
+    averages.  Once the error rate goes over ``error_threshold`` the region
+    is considered down for ``open_interval`` seconds, after which a single
+    request is let through to probe it.
+    """
+    def __init__(self, region, alpha=0.2, error_threshold=0.5, min_samples=3, open_interval=30, clock=time.time):
+        self.region = region
+        self.alpha = alpha
+        self.error_threshold = error_threshold
+        self.min_samples = min_samples
+        self.open_interval = open_interval
+        self.clock = clock
+
+        self.error_rate = 0.0
+        self.latency = None
+        self.samples = 0
+        self.open_until = None
+        self.lock = threading.Lock()
+
+    def _record(self, error, latency):
+        self.samples += 1
+        self.error_rate += self.alpha * ((1.0 if error else 0.0) - self.error_rate)
+        if self.latency is None:
+            self.latency = latency
+        else:
+            self.latency += self.alpha * (latency - self.latency)
+
+    def record_success(self, latency):
+        with self.lock:
+            self._record(False, latency)
+            self.open_until = None
+
+    def record_failure(self, latency):
+        with self.lock:
+            self._record(True, latency)
+            if self.open_until is not None or (
+                    self.samples >= self.min_samples and self.error_rate >= self.error_threshold):
+                self.open_until = self.clock() + self.open_interval
+
+    def is_open(self):
+        return self.open_until is not None and self.clock() < self.open_until
+
+    def is_available(self):
+        """
+        False while the region is down.  Once ``open_interval`` is over the
+        next caller is let through as a probe and the window restarts.
+        """
+        with self.lock:
+            if self.open_until is None:
+                return True
+            now = self.clock()
+            if now < self.open_until:
+                return False
+            self.open_until = now + self.open_interval
+            return True
+
+
+class HealthTracker(object):
+    def __init__(self, **health_kwargs):
+        self.health_kwargs = health_kwargs
+        self.regions = {}
+        self.lock = threading.Lock()
+
+    def __getitem__(self, region):
+        with self.lock:
+            try:
+                return self.regions[region]
+            except KeyError:
+                health = self.regions[region] = RegionHealth(region, **self.health_kwargs)
+                return health
+
+
+tracker = HealthTracker()
+
+
+class FailoverTranscoder(object):
+    """
+    Submit to the first healthy region of ELASTIC_TRANSCODER_REGIONS, a list of
+
+        {'region': ..., 'pipeline_id': ...}
+
+    in order of preference.  Jobs read and write the buckets of the pipeline
+    they go to, so the input must exist in the input bucket of each pipeline.
+
+    A region that fails is skipped and the next one is tried; regions with a
+    high recent error rate are skipped altogether until their
+    ``open_interval`` is over, as are regions whose circuit breaker is open.
+    Regions whose average latency is over ``max_latency`` seconds
+    (ELASTIC_TRANSCODER_FAILOVER_MAX_LATENCY) are only tried after the
+    others.  Requests rejected as invalid are not retried elsewhere.
+    """
+    def __init__(self, regions=None, access_key_id=None, secret_access_key=None, tracker=tracker,
+                 max_latency=None):
+        if regions is None:
+            regions = getattr(settings, 'ELASTIC_TRANSCODER_REGIONS', [])
+        assert regions, 'Please provide ELASTIC_TRANSCODER_REGIONS'
+
+        if max_latency is None:
+            max_latency = getattr(settings, 'ELASTIC_TRANSCODER_FAILOVER_MAX_LATENCY', None)
+
+        self.regions = regions
+        self.aws_access_key_id = access_key_id
+        self.aws_secret_access_key = secret_access_key
+        self.tracker = tracker
+        self.max_latency = max_latency
+
+    def get_transcoder(self, config):
+        return Transcoder(config['pipeline_id'], config['region'], self.aws_access_key_id, self.aws_secret_access_key)
+
+    def is_slow(self, config):
+        latency = self.tracker[config['region']].latency
+        return self.max_latency is not None and latency is not None and latency > self.max_latency
+
+    def candidates(self):
+        """
+        Regions in order of preference, the slow ones after the others and the
+        ones that are down last, the one that should recover first leading.
+        Probes are only taken by ``encode()``, for the region it calls.
+        """
+        up = [c for c in self.regions if not self.tracker[c['region']].is_open()]
+        down = [c for c in self.regions if self.tracker[c['region']].is_open()]
+        up.sort(key=self.is_slow)
+        down.sort(key=lambda c: self.tracker[c['region']].open_until)
+        return up + down
+
+    def attempt(self, config, input_name, outputs, playlists, kwargs):
+        """
+        Encode in the region of ``config``, returning ``(transcoder, error)``
+        """
+        health = self.tracker[config['region']]
+        transcoder = self.get_transcoder(config)
+
+        start = time.time()
+        try:
+            transcoder.encode(input_name, outputs, playlists, **kwargs)
+        except CircuitOpenError as e:
+            return None, e
+        except Exception as e:
+            if is_client_error(e):
+                raise
+            health.record_failure(time.time() - start)
+            return None, e
+
+        health.record_success(time.time() - start)
+        return transcoder, None
+
+    def encode(self, input_name, outputs, playlists=None, **kwargs):
+        """
+        Encode in the first region that accepts the job and return the
+        ``Transcoder`` used, ready for ``create_job_for_object()``.  When every
+        region is down the one that should recover first is tried anyway.
+        """
+        candidates = self.candidates()
+
+        error = None
+        for config in candidates:
+            if not self.tracker[config['region']].is_available():
+                continue
+            transcoder, error = self.attempt(config, input_name, outputs, playlists, kwargs)
+            if transcoder is not None:
+                return transcoder
+
+        if error is None:
+            transcoder, error = self.attempt(candidates[0], input_name, outputs, playlists, kwargs)
+            if transcoder is not None:
+                return transcoder
+
+        raise error
@@ -0,0 +1,44 @@
+import time
+
+from django.core.management.base import BaseCommand
+from optparse import make_option
+
+from dj_elastictranscoder.confirmations import confirm_pending
+
+
+class Command(BaseCommand):
+    help = 'Confirms the SNS subscriptions received by the endpoint, retrying failed confirmations with backoff.'
+
+    option_list = BaseCommand.option_list + (
+        make_option(
+            '--max-attempts',
+            dest='max_attempts',
+            type='int',
+            default=10,
+            help='Attempts before a confirmation is given up, defaults to 10',
+        ),
+        make_option(
+            '--interval',
+            dest='interval',
+            type='float',
+            default=30,
+            help='Seconds between checks for due confirmations, defaults to 30',
+        ),
+        make_option(
+            '--once',
+            dest='once',
+            action='store_true',
+            default=False,
+            help='Process the due confirmations once and exit',
+        ),
+    )
+
+    def handle(self, *args, **kwargs):
+        while True:
+            confirmed, failed = confirm_pending(kwargs["max_attempts"])
+            if confirmed or failed:
+                self.stdout.write('Confirmed %d subscriptions, %d failed' % (confirmed, failed))
+
+            if kwargs["once"]:
+                break
+            time.sleep(kwargs["interval"])
@@ -0,0 +1,85 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from optparse import make_option
+
+from dj_elastictranscoder.consumer import consume_once, get_queue, start_pollers
+
+
+class Command(BaseCommand):
+    help = 'Applies the notifications of an SQS queue subscribed to the pipeline topic (see create_encoder_queue), as an alternative to the HTTP endpoint.'
+
+    option_list = BaseCommand.option_list + (
+        make_option(
+            '--queue',
+            dest='queue',
+            help='Name of the queue, defaults to ELASTIC_TRANSCODER_QUEUE',
+        ),
+        make_option(
+            '--region',
+            dest='region',
+            help='Region of the queue, defaults to AWS_REGION',
+        ),
+        make_option(
+            '--threads',
+            dest='threads',
+            type='int',
+            default=4,
+            help='Number of threads polling the queue, defaults to 4',
+        ),
+        make_option(
+            '--wait-time',
+            dest='wait_time',
+            type='int',
+            default=20,
+            help='Seconds each receive waits for messages (long polling), defaults to 20',
+        ),
+        make_option(
+            '--visibility-timeout',
+            dest='visibility_timeout',
+            type='int',
+            help='Seconds before notifications that were not applied are received again, defaults to the queue setting',
+        ),
+        make_option(
+            '--once',
+            dest='once',
+            action='store_true',
+            default=False,
+            help='Exit once the queue is empty instead of polling for new notifications',
+        ),
+    )
+
+    def handle(self, *args, **kwargs):
+        name = kwargs["queue"] or getattr(settings, 'ELASTIC_TRANSCODER_QUEUE', None)
+        if not name:
+            raise CommandError('Please provide --queue or ELASTIC_TRANSCODER_QUEUE on the settings module')
+
+        access_key_id = getattr(settings, 'AWS_ACCESS_KEY_ID', None)
+        secret_access_key = getattr(settings, 'AWS_SECRET_ACCESS_KEY', None)
+        region = kwargs["region"] or getattr(settings, 'AWS_REGION', None)
+
+        try:
+            queue = get_queue(name, region, access_key_id, secret_access_key)
+        except ValueError, e:
+            raise CommandError(str(e))
+
+        if kwargs["once"]:
+            received = 0
+            while True:
+                count = consume_once(queue, 0, kwargs["visibility_timeout"])
+                if not count:
+                    break
+                received += count
+            self.stdout.write('Received %d notifications' % received)
+            return
+
+        self.stdout.write('Polling %s with %d threads' % (name, kwargs["threads"]))
+        stop, pollers = start_pollers(queue, kwargs["threads"], kwargs["wait_time"], kwargs["visibility_timeout"])
+        try:
+            while True:
+                time.sleep(1)
+        except KeyboardInterrupt:
+            stop.set()
+            for thread in pollers:
+                thread.join()
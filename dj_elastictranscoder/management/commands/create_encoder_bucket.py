@@ -1,6 +1,7 @@
 from boto.exception import BotoServerError
-from boto.s3.connection import Location, S3Connection
+from boto.s3.connection import Location
 from django.core.management.base import BaseCommand, CommandError
+from dj_elastictranscoder.connections import get_connection
 from json import dumps
 from optparse import make_option
 from uuid import uuid4
@@ -71,7 +72,7 @@ class Command(BaseCommand):
             else:
                 log('Region was not specified on the command line or on the settings module.  Proceeding without setting the S3 region.  This is not recommended.')
         
-        conn = S3Connection(access_key_id, secret_access_key)
+        conn = get_connection('s3', None, access_key_id, secret_access_key)
         conn.create_bucket(bucket, location=REGION_MAP[region])
         
         log('Created bucket %s' % bucket)
@@ -1,6 +1,7 @@
 from boto import iam
 from boto.exception import BotoServerError
 from django.core.management.base import BaseCommand, CommandError
+from dj_elastictranscoder.connections import get_connection
 from json import dumps
 from optparse import make_option
 from uuid import uuid4
@@ -86,7 +87,7 @@ class Command(BaseCommand):
         # policy copied from the default set by the elastic transcoder web interface
         access_policy = '{"Version":"2008-10-17","Statement":[{"Sid":"1","Effect":"Allow","Action":["s3:ListBucket","s3:Put*","s3:Get*","s3:*MultipartUpload*"],"Resource":"*"},{"Sid":"2","Effect":"Allow","Action":"sns:Publish","Resource":"*"},{"Sid":"3","Effect":"Deny","Action":["s3:*Policy*","sns:*Permission*","sns:*Delete*","s3:*Delete*","sns:*Remove*"],"Resource":"*"}]}'
         
-        connection = iam.connection.IAMConnection(access_key_id, secret_access_key)
+        connection = get_connection('iam', None, access_key_id, secret_access_key)
         response = connection.create_role(role, assume_role_policy_document=assume_policy, path="/")
         connection.put_role_policy(role, "ets-console-generated-policy-copied-on-2014-05-18", access_policy)
         
@@ -0,0 +1,74 @@
+from boto.exception import BotoServerError
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from dj_elastictranscoder.connections import get_connection
+from json import loads
+from optparse import make_option
+from StringIO import StringIO
+from .create_encoder_topic import VALID_REGIONS
+
+class Command(BaseCommand):
+    help = 'Creates an SQS queue for consume_encoder_queue and subscribes it to an SNS topic for use with an Elastic Transcoder Pipeline.  The queue and the topic are created if they do not exist.'
+
+    option_list = BaseCommand.option_list + (
+        make_option(
+            '--queue',
+            dest='queue',
+            help='The name of the queue, defaults to ELASTIC_TRANSCODER_QUEUE.',
+        ),
+        make_option(
+            '--topic',
+            dest='topic',
+            help='The name of the topic to use.  Will be generated if not provided.  Topic will be created if it does not exist.  This should be the last part of the colon (:) delimited arn.',
+        ),
+        make_option(
+            '--region',
+            dest='region',
+            help='One of {0}'.format(VALID_REGIONS),
+        ),
+    )
+
+    def handle(self, *args, **kwargs):
+        from django.conf import settings
+
+        name = kwargs["queue"] or getattr(settings, 'ELASTIC_TRANSCODER_QUEUE', None)
+        if not name:
+            raise CommandError("The 'queue' kwarg or ELASTIC_TRANSCODER_QUEUE is required.")
+
+        region = kwargs["region"] or getattr(settings, 'AWS_REGION', None)
+        if region and region not in VALID_REGIONS:
+            raise CommandError('Invalid region specified.  Region must be one of {0}.'.format(VALID_REGIONS))
+
+        access_key_id = getattr(settings, 'AWS_ACCESS_KEY_ID', None)
+        secret_access_key = getattr(settings, 'AWS_SECRET_ACCESS_KEY', None)
+
+        if access_key_id is None:
+            raise CommandError('Please provide AWS_ACCESS_KEY_ID on the settings module')
+
+        if secret_access_key is None:
+            raise CommandError('Please provide AWS_SECRET_ACCESS_KEY on the settings module')
+
+        sqs = get_connection('sqs', region, access_key_id, secret_access_key)
+        queue = sqs.get_queue(name)
+        if queue is None:
+            self.stdout.write('Creating queue "%s"' % name)
+            queue = sqs.create_queue(name)
+        else:
+            self.stdout.write('Queue "%s" already existed' % name)
+
+        out = StringIO()
+        call_command("create_encoder_topic", topic=kwargs["topic"], region=region, json=True, stdout=out)
+        arn = loads(out.getvalue())["arn"]
+
+        # also grants the topic permission to send to the queue
+        self.stdout.write('Subscribing %s to %s' % (name, arn))
+        try:
+            get_connection('sns', region, access_key_id, secret_access_key).subscribe_sqs_queue(arn, queue)
+        except BotoServerError, e:
+            raise CommandError(
+                'Attempting subscription raised the following exception:\n\tCode: {0}\n\tMessage: {1}'.format(
+                    e.error_code,
+                    e.message,
+                )
+            )
+        self.stdout.write('Subscribed.  Run consume_encoder_queue --queue %s to apply the notifications.' % name)
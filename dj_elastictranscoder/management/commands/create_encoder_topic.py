@@ -1,6 +1,7 @@
 from boto import sns
 from boto.exception import BotoServerError
 from django.core.management.base import BaseCommand, CommandError
+from dj_elastictranscoder.connections import get_connection
 from json import dumps
 from optparse import make_option
 from uuid import uuid4
@@ -71,14 +72,11 @@ class Command(BaseCommand):
             else:
                 log('Region was not specified on the command line or on the settings module.  Proceeding without setting the sns region.  This is not recommended.')
         
-        if region:
-            sns.connect_to_region(region)
-        
         #
         #    connect to sns
         #
         log('Creating sns connection')
-        connection = sns.SNSConnection(aws_access_key_id=access_key_id, aws_secret_access_key=secret_access_key)
+        connection = get_connection('sns', region, access_key_id, secret_access_key)
         
         #
         #    retrieve sns topics
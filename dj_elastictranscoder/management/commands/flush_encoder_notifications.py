@@ -0,0 +1,98 @@
+import json
+import logging
+import time
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.utils import timezone
+from optparse import make_option
+
+from dj_elastictranscoder.models import BufferedNotification
+from dj_elastictranscoder.notifications import is_job_notification, notify_all, update_jobs
+
+logger = logging.getLogger("dj_elastictranscoder.notifications")
+
+
+class Command(BaseCommand):
+    help = 'Applies the notifications buffered by the endpoint when ELASTIC_TRANSCODER_NOTIFICATION_MODE is "buffered".'
+
+    option_list = BaseCommand.option_list + (
+        make_option(
+            '--batch-size',
+            dest='batch_size',
+            type='int',
+            default=500,
+            help='Number of notifications applied at a time, defaults to 500',
+        ),
+        make_option(
+            '--interval',
+            dest='interval',
+            type='float',
+            default=1,
+            help='Seconds to sleep when the buffer is empty, defaults to 1',
+        ),
+        make_option(
+            '--retry-for',
+            dest='retry_for',
+            type='int',
+            default=600,
+            help='Seconds to keep retrying notifications for jobs that do not exist yet, defaults to 600',
+        ),
+        make_option(
+            '--once',
+            dest='once',
+            action='store_true',
+            default=False,
+            help='Exit once the buffer is empty instead of polling for new notifications',
+        ),
+    )
+
+    def handle(self, *args, **kwargs):
+        after = 0
+        while True:
+            count, after = self.flush(after, kwargs["batch_size"], kwargs["retry_for"])
+
+            if not count:
+                if kwargs["once"]:
+                    break
+                # start over to retry the notifications kept for missing jobs
+                after = 0
+                time.sleep(kwargs["interval"])
+
+    def flush(self, after, batch_size, retry_for):
+        """
+        Apply the next batch of notifications after the id ``after``, returning
+        the number of notifications and the last id seen
+        """
+        rows = list(BufferedNotification.objects.filter(pk__gt=after).order_by('pk')[:batch_size])
+        if not rows:
+            return 0, after
+
+        messages = {}
+        invalid = []
+        for row in rows:
+            try:
+                message = json.loads(row.message)
+            except ValueError:
+                message = None
+            if is_job_notification(message):
+                messages[row.pk] = message
+            else:
+                logger.error("Dropped buffered notification %s that is not a job notification: '%s'", row.pk, row.message)
+                invalid.append(row.pk)
+
+        expired = timezone.now() - timedelta(seconds=retry_for)
+
+        with transaction.atomic():
+            missing, signals = update_jobs(messages.values())
+
+            done = [row.pk for row in rows if row.pk in messages and (
+                messages[row.pk]['jobId'] not in missing or row.created_at < expired)]
+            BufferedNotification.objects.filter(pk__in=done + invalid).delete()
+
+        # once committed, so a failing receiver does not hold up the buffer
+        notify_all(signals)
+
+        self.stdout.write('Applied %d notifications' % len(done))
+        return len(rows), rows[-1].pk
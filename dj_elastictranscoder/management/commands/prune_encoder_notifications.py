@@ -0,0 +1,27 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+from optparse import make_option
+
+from dj_elastictranscoder.models import ReceivedNotification
+
+
+class Command(BaseCommand):
+    help = 'Deletes the MessageIds of old notifications kept to ignore SNS redeliveries.'
+
+    option_list = BaseCommand.option_list + (
+        make_option(
+            '--days',
+            dest='days',
+            type='int',
+            default=7,
+            help='Keep the MessageIds of the notifications received in the last DAYS days, defaults to 7',
+        ),
+    )
+
+    def handle(self, *args, **kwargs):
+        cutoff = timezone.now() - timedelta(days=kwargs["days"])
+
+        ReceivedNotification.objects.filter(received_at__lt=cutoff).delete()
+        self.stdout.write('Deleted MessageIds received before %s' % cutoff)
@@ -0,0 +1,29 @@
+from django.core.management.base import BaseCommand
+from optparse import make_option
+
+from dj_elastictranscoder.reconcile import reconcile
+
+
+class Command(BaseCommand):
+    help = 'Corrects the state of active jobs whose notifications were lost, using the job lists of elastic transcoder.'
+
+    option_list = BaseCommand.option_list + (
+        make_option(
+            '--stale-after',
+            dest='stale_after',
+            type='int',
+            default=3600,
+            help='Seconds after which an active job that did not change is reconciled, defaults to 3600',
+        ),
+        make_option(
+            '--batch-size',
+            dest='batch_size',
+            type='int',
+            default=500,
+            help='Number of corrections applied at a time, defaults to 500',
+        ),
+    )
+
+    def handle(self, *args, **kwargs):
+        checked, corrected = reconcile(kwargs["stale_after"], kwargs["batch_size"])
+        self.stdout.write('Checked %d jobs, corrected %d' % (checked, corrected))
@@ -0,0 +1,87 @@
+import json
+from datetime import datetime
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
+from optparse import make_option
+
+from dj_elastictranscoder.models import ArchivedNotification
+from dj_elastictranscoder.notifications import is_job_notification, notify_all, update_jobs
+
+
+def parse(value):
+    parsed = parse_datetime(value)
+    if parsed is None:
+        date = parse_date(value)
+        if date is None:
+            raise CommandError('"%s" is not a date or a date and time' % value)
+        parsed = datetime(date.year, date.month, date.day)
+
+    if settings.USE_TZ and timezone.is_naive(parsed):
+        parsed = timezone.make_aware(parsed, timezone.get_current_timezone())
+    return parsed
+
+
+class Command(BaseCommand):
+    help = 'Applies the notifications archived when ELASTIC_TRANSCODER_ARCHIVE_NOTIFICATIONS is True again, in the order they were received.'
+
+    option_list = BaseCommand.option_list + (
+        make_option(
+            '--since',
+            dest='since',
+            help='Replay the notifications received at or after this date (and time)',
+        ),
+        make_option(
+            '--until',
+            dest='until',
+            help='Replay the notifications received before this date (and time)',
+        ),
+        make_option(
+            '--batch-size',
+            dest='batch_size',
+            type='int',
+            default=1000,
+            help='Number of notifications applied at a time, defaults to 1000',
+        ),
+    )
+
+    def handle(self, *args, **kwargs):
+        archive = ArchivedNotification.objects.all()
+        if kwargs["since"]:
+            archive = archive.filter(received_at__gte=parse(kwargs["since"]))
+        if kwargs["until"]:
+            archive = archive.filter(received_at__lt=parse(kwargs["until"]))
+
+        applied = missing = skipped = 0
+        after = 0
+        while True:
+            # keyset pagination, only one batch is in memory at a time
+            rows = list(archive.filter(pk__gt=after).order_by('pk').values_list('pk', 'message')[:kwargs["batch_size"]])
+            if not rows:
+                break
+            after = rows[-1][0]
+
+            messages = []
+            for pk, raw in rows:
+                try:
+                    message = json.loads(raw)
+                except ValueError:
+                    message = None
+                if is_job_notification(message):
+                    messages.append(message)
+                else:
+                    skipped += 1
+
+            if messages:
+                with transaction.atomic():
+                    batch_missing, signals = update_jobs(messages)
+                missing += len(batch_missing)
+                # once committed, so a failing receiver does not abort the replay
+                notify_all(signals)
+            applied += len(messages)
+
+        self.stdout.write('Replayed %d notifications, %d jobs do not exist, skipped %d invalid notifications' % (
+            applied, missing, skipped))
@@ -0,0 +1,68 @@
+import time
+
+from django.core.management.base import BaseCommand
+from optparse import make_option
+
+from dj_elastictranscoder.outbox import claim_requests, process_requests
+
+
+class Command(BaseCommand):
+    help = 'Submits encode jobs recorded with Transcoder.enqueue() to elastic transcoder.  Several workers may run at once.'
+
+    option_list = BaseCommand.option_list + (
+        make_option(
+            '--batch-size',
+            dest='batch_size',
+            type='int',
+            default=100,
+            help='Number of outbox rows claimed at a time, defaults to 100',
+        ),
+        make_option(
+            '--workers',
+            dest='workers',
+            type='int',
+            help='Number of concurrent create_job requests, defaults to ELASTIC_TRANSCODER_MAX_WORKERS',
+        ),
+        make_option(
+            '--interval',
+            dest='interval',
+            type='float',
+            default=5,
+            help='Seconds to sleep when the outbox is empty, defaults to 5',
+        ),
+        make_option(
+            '--claim-timeout',
+            dest='claim_timeout',
+            type='int',
+            default=300,
+            help='Seconds after which rows claimed by a dead worker are claimed again, defaults to 300. '
+                 'Must be longer than the slowest batch',
+        ),
+        make_option(
+            '--max-attempts',
+            dest='max_attempts',
+            type='int',
+            default=5,
+            help='Submission attempts before a row is marked as failed, defaults to 5',
+        ),
+        make_option(
+            '--once',
+            dest='once',
+            action='store_true',
+            default=False,
+            help='Exit once the outbox is empty instead of polling for new rows',
+        ),
+    )
+
+    def handle(self, *args, **kwargs):
+        while True:
+            requests = claim_requests(kwargs["batch_size"], kwargs["claim_timeout"])
+
+            if not requests:
+                if kwargs["once"]:
+                    break
+                time.sleep(kwargs["interval"])
+                continue
+
+            submitted, failed = process_requests(requests, kwargs["workers"], kwargs["max_attempts"])
+            self.stdout.write('Submitted %d jobs, %d failed' % (submitted, failed))
@@ -1,7 +1,7 @@
-from boto import sns
 from boto.exception import BotoServerError
 from django.core.management import call_command
 from django.core.management.base import BaseCommand, CommandError
+from dj_elastictranscoder.connections import get_connection
 from django.core.urlresolvers import reverse
 from json import loads
 from optparse import make_option
@@ -95,14 +95,11 @@ class Command(BaseCommand):
             else:
                 self.stdout.write('Region was not specified on the command line or on the settings module.  Proceeding without setting the sns region.  This is not recommended.')
         
-        if region:
-            sns.connect_to_region(region)
-        
         #
         #    connect to sns
         #
         self.stdout.write('Creating sns connection')
-        connection = sns.SNSConnection(aws_access_key_id=access_key_id, aws_secret_access_key=secret_access_key)
+        connection = get_connection('sns', region, access_key_id, secret_access_key)
         
         out = StringIO()
         call_command("create_encoder_topic", topic=topic, region=region, json=True, stdout=out)
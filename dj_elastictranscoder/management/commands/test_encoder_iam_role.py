@@ -1,5 +1,6 @@
 from boto import elastictranscoder
 from django.core.management.base import BaseCommand, CommandError
+from dj_elastictranscoder.connections import get_connection
 from optparse import make_option
 
 VALID_REGIONS = set([r.name for r in elastictranscoder.regions()])
@@ -94,14 +95,11 @@ class Command(BaseCommand):
             else:
                 self.stdout.write('Region was not specified on the command line or on the settings module.  Proceeding without setting the elastic transcoder region.  This is not recommended.')
         
-        if region:
-            elastictranscoder.connect_to_region(region)
-        
         #
         #    connect to elastic transcoder
         #
         self.stdout.write('Creating elastic transcoder connection')
-        connection = elastictranscoder.layer1.ElasticTranscoderConnection(aws_access_key_id=access_key_id, aws_secret_access_key=secret_access_key)
+        connection = get_connection('elastictranscoder', region, access_key_id, secret_access_key)
         
         #
         #    test iam role for usage with an elastic transcoder pipeline
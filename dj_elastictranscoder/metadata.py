@@ -0,0 +1,155 @@
+from boto.elastictranscoder.exceptions import ResourceNotFoundException
+
+from django.conf import settings
+from django.core.cache import caches
+
+
+PLAYLIST_CONTAINERS = {
+    'HLSv3': 'ts',
+    'HLSv4': 'ts',
+    'Smooth': 'fmp4',
+    'MPEG-DASH': 'fmp4',
+}
+
+
+class InvalidEncodeRequest(ValueError):
+    pass
+
+
+def get_cache():
+    return caches[getattr(settings, 'ELASTIC_TRANSCODER_CACHE', 'default')]
+
+
+def get_timeout():
+    return getattr(settings, 'ELASTIC_TRANSCODER_METADATA_TIMEOUT', 3600)
+
+
+def presets_key(region):
+    return 'dj_elastictranscoder:presets:%s' % region
+
+
+def pipeline_key(region, pipeline_id):
+    return 'dj_elastictranscoder:pipeline:%s:%s' % (region, pipeline_id)
+
+
+def get_presets(transcoder):
+    """
+    Return every preset of the transcoder's region as a dict keyed by id
+    """
+    cache = get_cache()
+    key = presets_key(transcoder.aws_region)
+
+    presets = cache.get(key)
+    if presets is None:
+        connection = transcoder.get_connection()
+
+        presets = {}
+        result = None
+        token = None
+        while result is None or token:
+            result = connection.list_presets(page_token=token)
+            token = result.get("NextPageToken", None)
+            for preset in result.get("Presets", []):
+                presets[preset["Id"]] = preset
+
+        cache.set(key, presets, get_timeout())
+
+    return presets
+
+
+def get_preset(transcoder, preset_id):
+    """
+    Return the preset or None if it does not exist.  Presets created after
+    the cache was filled are read individually and added to it.
+    """
+    presets = get_presets(transcoder)
+    try:
+        return presets[preset_id]
+    except KeyError:
+        pass
+
+    try:
+        preset = transcoder.get_connection().read_preset(preset_id)["Preset"]
+    except ResourceNotFoundException:
+        return None
+
+    presets[preset_id] = preset
+    get_cache().set(presets_key(transcoder.aws_region), presets, get_timeout())
+
+    return preset
+
+
+def get_pipeline(transcoder, pipeline_id=None):
+    """
+    Return the pipeline or None if it does not exist
+    """
+    if pipeline_id is None:
+        pipeline_id = transcoder.pipeline_id
+
+    cache = get_cache()
+    key = pipeline_key(transcoder.aws_region, pipeline_id)
+
+    pipeline = cache.get(key)
+    if pipeline is None:
+        try:
+            pipeline = transcoder.get_connection().read_pipeline(pipeline_id)["Pipeline"]
+        except ResourceNotFoundException:
+            return None
+        cache.set(key, pipeline, get_timeout())
+
+    return pipeline
+
+
+def invalidate_presets(region):
+    get_cache().delete(presets_key(region))
+
+
+def invalidate_pipeline(region, pipeline_id):
+    get_cache().delete(pipeline_key(region, pipeline_id))
+
+
+def validate(transcoder, input_name, outputs, playlists=None):
+    """
+    Check a job against the cached pipeline and presets, raising
+    ``InvalidEncodeRequest`` for anything elastic transcoder would reject
+    """
+    if get_pipeline(transcoder) is None:
+        raise InvalidEncodeRequest('Pipeline "%s" does not exist' % transcoder.pipeline_id)
+
+    if not input_name or not input_name.get('Key'):
+        raise InvalidEncodeRequest('Input key is required')
+
+    if not outputs:
+        raise InvalidEncodeRequest('At least one output is required')
+
+    containers = {}
+    for output in outputs:
+        key = output.get('Key')
+        if not key:
+            raise InvalidEncodeRequest('Output key is required')
+        if key in containers:
+            raise InvalidEncodeRequest('Output key "%s" is used more than once' % key)
+
+        if not output.get('PresetId'):
+            raise InvalidEncodeRequest('Output "%s" needs a PresetId' % key)
+
+        preset = get_preset(transcoder, output.get('PresetId'))
+        if preset is None:
+            raise InvalidEncodeRequest('Preset "%s" does not exist' % output.get('PresetId'))
+
+        containers[key] = (preset.get('Container'), output.get('SegmentDuration'))
+
+    for playlist in playlists or []:
+        format = playlist.get('Format')
+        if format not in PLAYLIST_CONTAINERS:
+            raise InvalidEncodeRequest('Unknown playlist format "%s"' % format)
+
+        for key in playlist.get('OutputKeys', []):
+            if key not in containers:
+                raise InvalidEncodeRequest('Playlist "%s" refers to unknown output "%s"' % (playlist.get('Name'), key))
+
+            container, segment_duration = containers[key]
+            if container != PLAYLIST_CONTAINERS[format]:
+                raise InvalidEncodeRequest('Output "%s" uses container "%s" which cannot be used in a %s playlist' % (key, container, format))
+            if not segment_duration:
+                raise InvalidEncodeRequest('Output "%s" needs a SegmentDuration to be used in a playlist' % key)
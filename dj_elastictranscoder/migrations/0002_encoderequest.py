@@ -0,0 +1,37 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import models, migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('contenttypes', '0001_initial'),
+        ('dj_elastictranscoder', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='EncodeRequest',
+            fields=[
+                ('id', models.AutoField(verbose_name='ID', serialize=False, auto_created=True, primary_key=True)),
+                ('object_id', models.PositiveIntegerField()),
+                ('pipeline_id', models.CharField(max_length=100)),
+                ('input', models.TextField()),
+                ('outputs', models.TextField()),
+                ('playlists', models.TextField(blank=True)),
+                ('state', models.PositiveIntegerField(default=0, db_index=True, choices=[(0, b'Pending'), (1, b'Claimed'), (2, b'Submitted'), (3, b'Failed')])),
+                ('claim', models.CharField(db_index=True, max_length=32, blank=True)),
+                ('attempts', models.PositiveIntegerField(default=0)),
+                ('error', models.TextField(blank=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('last_modified', models.DateTimeField(auto_now=True)),
+                ('content_type', models.ForeignKey(to='contenttypes.ContentType')),
+                ('job', models.ForeignKey(blank=True, to='dj_elastictranscoder.EncodeJob', null=True)),
+            ],
+            options={
+            },
+            bases=(models.Model,),
+        ),
+    ]
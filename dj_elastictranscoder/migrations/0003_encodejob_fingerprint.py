@@ -0,0 +1,26 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import models, migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('dj_elastictranscoder', '0002_encoderequest'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='encodejob',
+            name='duplicate_of',
+            field=models.ForeignKey(related_name='duplicates', blank=True, to='dj_elastictranscoder.EncodeJob', null=True),
+            preserve_default=True,
+        ),
+        migrations.AddField(
+            model_name='encodejob',
+            name='fingerprint',
+            field=models.CharField(db_index=True, max_length=64, blank=True),
+            preserve_default=True,
+        ),
+    ]
@@ -0,0 +1,20 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import models, migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('dj_elastictranscoder', '0003_encodejob_fingerprint'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='encodejob',
+            name='pipeline_id',
+            field=models.CharField(db_index=True, max_length=100, blank=True),
+            preserve_default=True,
+        ),
+    ]
@@ -0,0 +1,26 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import models, migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('dj_elastictranscoder', '0007_receivednotification'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ArchivedNotification',
+            fields=[
+                ('id', models.AutoField(verbose_name='ID', serialize=False, auto_created=True, primary_key=True)),
+                ('message_id', models.CharField(max_length=100, blank=True)),
+                ('message', models.TextField()),
+                ('received_at', models.DateTimeField(auto_now_add=True, db_index=True)),
+            ],
+            options={
+            },
+            bases=(models.Model,),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import models, migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('dj_elastictranscoder', '0008_archivednotification'),
+    ]
+
+    operations = [
+        migrations.AlterIndexTogether(
+            name='encodejob',
+            index_together=set([('state', 'last_modified')]),
+        ),
+    ]
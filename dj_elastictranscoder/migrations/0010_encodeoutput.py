@@ -0,0 +1,36 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import models, migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('dj_elastictranscoder', '0009_encodejob_state_last_modified_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='EncodeOutput',
+            fields=[
+                ('id', models.AutoField(verbose_name='ID', serialize=False, auto_created=True, primary_key=True)),
+                ('output_id', models.CharField(max_length=20)),
+                ('key', models.CharField(max_length=255, blank=True)),
+                ('preset_id', models.CharField(db_index=True, max_length=100, blank=True)),
+                ('status', models.CharField(db_index=True, max_length=20, blank=True)),
+                ('status_detail', models.TextField(blank=True)),
+                ('duration', models.PositiveIntegerField(null=True, blank=True)),
+                ('width', models.PositiveIntegerField(null=True, blank=True)),
+                ('height', models.PositiveIntegerField(null=True, blank=True)),
+                ('job', models.ForeignKey(related_name='outputs', to='dj_elastictranscoder.EncodeJob')),
+            ],
+            options={
+            },
+            bases=(models.Model,),
+        ),
+        migrations.AlterUniqueTogether(
+            name='encodeoutput',
+            unique_together=set([('job', 'output_id')]),
+        ),
+    ]
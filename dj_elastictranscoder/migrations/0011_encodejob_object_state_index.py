@@ -0,0 +1,18 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import models, migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('dj_elastictranscoder', '0010_encodeoutput'),
+    ]
+
+    operations = [
+        migrations.AlterIndexTogether(
+            name='encodejob',
+            index_together=set([('content_type', 'object_id', 'state'), ('state', 'last_modified')]),
+        ),
+    ]
@@ -0,0 +1,33 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import models, migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('contenttypes', '0001_initial'),
+        ('dj_elastictranscoder', '0011_encodejob_object_state_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='EncodeStatus',
+            fields=[
+                ('id', models.AutoField(verbose_name='ID', serialize=False, auto_created=True, primary_key=True)),
+                ('object_id', models.PositiveIntegerField()),
+                ('state', models.PositiveIntegerField(choices=[(0, b'Submitted'), (1, b'Progressing'), (2, b'Error'), (3, b'Complete')])),
+                ('last_modified', models.DateTimeField(auto_now=True)),
+                ('content_type', models.ForeignKey(to='contenttypes.ContentType')),
+                ('job', models.ForeignKey(related_name='+', to='dj_elastictranscoder.EncodeJob')),
+            ],
+            options={
+            },
+            bases=(models.Model,),
+        ),
+        migrations.AlterUniqueTogether(
+            name='encodestatus',
+            unique_together=set([('content_type', 'object_id')]),
+        ),
+    ]
@@ -0,0 +1,20 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import models, migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('dj_elastictranscoder', '0012_encodestatus'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='encoderequest',
+            name='region',
+            field=models.CharField(max_length=32, blank=True),
+            preserve_default=True,
+        ),
+    ]
@@ -3,6 +3,53 @@ from django.contrib.contenttypes.models import ContentType
 from django.contrib.contenttypes.generic import GenericForeignKey
 
 
+class EncodeJobQuerySet(models.QuerySet):
+
+    def for_objects(self, objs):
+        """
+        Jobs of any of ``objs``, which may be instances of different models
+        """
+        by_model = {}
+        for obj in objs:
+            by_model.setdefault(obj.__class__, []).append(obj.pk)
+
+        query = models.Q()
+        for model, ids in by_model.items():
+            query |= models.Q(content_type=ContentType.objects.get_for_model(model), object_id__in=ids)
+
+        if not by_model:
+            return self.none()
+        return self.filter(query)
+
+    def latest_for_objects(self, objs):
+        """
+        The latest job of each of ``objs`` with one query, as a dict of
+        object: job leaving out the objects without jobs
+        """
+        objs = list(objs)
+        latest = {}
+        for job in self.for_objects(objs).order_by('created_at', 'pk'):
+            latest[(job.content_type_id, job.object_id)] = job
+
+        jobs = {}
+        for obj in objs:
+            key = (ContentType.objects.get_for_model(obj).pk, obj.pk)
+            if key in latest:
+                jobs[obj] = latest[key]
+        return jobs
+
+    def prefetch_latest(self, objs, to_attr='latest_encode_job'):
+        """
+        Set ``to_attr`` of each of ``objs`` to its latest job, or None, so
+        templates listing the objects do not query their jobs one by one
+        """
+        objs = list(objs)
+        jobs = self.latest_for_objects(objs)
+        for obj in objs:
+            setattr(obj, to_attr, jobs.get(obj))
+        return objs
+
+
 class EncodeJob(models.Model):
     STATE_SUBMITTED = 0
     STATE_PROGRESSING = 1
@@ -21,6 +68,128 @@ class EncodeJob(models.Model):
     object_id = models.PositiveIntegerField()
     state = models.PositiveIntegerField(choices=STATE_CHOICES, default=0, db_index=True)
     content_object = GenericForeignKey()
+    pipeline_id = models.CharField(max_length=100, blank=True, db_index=True)
     message = models.TextField()
+    fingerprint = models.CharField(max_length=64, blank=True, db_index=True)
+    duplicate_of = models.ForeignKey('self', null=True, blank=True, related_name='duplicates')
     created_at = models.DateTimeField(auto_now_add=True)
     last_modified = models.DateTimeField(auto_now=True)
+
+    objects = EncodeJobQuerySet.as_manager()
+
+    class Meta:
+        index_together = [
+            ('state', 'last_modified'),
+            ('content_type', 'object_id', 'state'),
+        ]
+
+
+class EncodeOutput(models.Model):
+    """
+    Output of an ``EncodeJob`` as reported by its last notification
+    """
+    job = models.ForeignKey(EncodeJob, related_name='outputs')
+    output_id = models.CharField(max_length=20)
+    key = models.CharField(max_length=255, blank=True)
+    preset_id = models.CharField(max_length=100, blank=True, db_index=True)
+    status = models.CharField(max_length=20, blank=True, db_index=True)
+    status_detail = models.TextField(blank=True)
+    duration = models.PositiveIntegerField(null=True, blank=True)
+    width = models.PositiveIntegerField(null=True, blank=True)
+    height = models.PositiveIntegerField(null=True, blank=True)
+
+    class Meta:
+        unique_together = [
+            ('job', 'output_id'),
+        ]
+
+
+class EncodeRequest(models.Model):
+    """
+    Outbox row for a job that has to be submitted by ``run_encode_worker``
+    """
+    STATE_PENDING = 0
+    STATE_CLAIMED = 1
+    STATE_SUBMITTED = 2
+    STATE_FAILED = 3
+    STATE_CHOICES = (
+        (STATE_PENDING, 'Pending'),
+        (STATE_CLAIMED, 'Claimed'),
+        (STATE_SUBMITTED, 'Submitted'),
+        (STATE_FAILED, 'Failed'),
+    )
+
+    content_type = models.ForeignKey(ContentType)
+    object_id = models.PositiveIntegerField()
+    content_object = GenericForeignKey()
+    pipeline_id = models.CharField(max_length=100)
+    region = models.CharField(max_length=32, blank=True)
+    input = models.TextField()
+    outputs = models.TextField()
+    playlists = models.TextField(blank=True)
+    state = models.PositiveIntegerField(choices=STATE_CHOICES, default=STATE_PENDING, db_index=True)
+    claim = models.CharField(max_length=32, blank=True, db_index=True)
+    attempts = models.PositiveIntegerField(default=0)
+    error = models.TextField(blank=True)
+    job = models.ForeignKey(EncodeJob, null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    last_modified = models.DateTimeField(auto_now=True)
+
+
+class BufferedNotification(models.Model):
+    """
+    Notification accepted by the endpoint in buffered mode, applied later
+    by ``flush_encoder_notifications``
+    """
+    message = models.TextField()
+    created_at = models.DateTimeField(auto_now_add=True)
+
+
+class PendingConfirmation(models.Model):
+    """
+    SNS subscription waiting to be confirmed by visiting ``subscribe_url``
+    """
+    topic_arn = models.CharField(max_length=255, blank=True)
+    subscribe_url = models.TextField()
+    attempts = models.PositiveIntegerField(default=0)
+    next_attempt_at = models.DateTimeField(db_index=True)
+    confirmed_at = models.DateTimeField(null=True, blank=True)
+    error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+
+class ReceivedNotification(models.Model):
+    """
+    MessageId of a notification already applied, to ignore SNS redeliveries
+    """
+    message_id = models.CharField(max_length=100, unique=True)
+    received_at = models.DateTimeField(auto_now_add=True, db_index=True)
+
+
+class ArchivedNotification(models.Model):
+    """
+    Raw notification received by the endpoint, kept when
+    ELASTIC_TRANSCODER_ARCHIVE_NOTIFICATIONS is True so it can be applied
+    again by ``replay_encoder_notifications``
+    """
+    message_id = models.CharField(max_length=100, blank=True)
+    message = models.TextField()
+    received_at = models.DateTimeField(auto_now_add=True, db_index=True)
+
+
+class EncodeStatus(models.Model):
+    """
+    State of the latest job of an object, kept up to date when
+    ELASTIC_TRANSCODER_STATUS_CACHE is True and cached by ``status.get_many()``
+    """
+    content_type = models.ForeignKey(ContentType)
+    object_id = models.PositiveIntegerField()
+    content_object = GenericForeignKey()
+    job = models.ForeignKey(EncodeJob, related_name='+')
+    state = models.PositiveIntegerField(choices=EncodeJob.STATE_CHOICES)
+    last_modified = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        unique_together = [
+            ('content_type', 'object_id'),
+        ]
@@ -0,0 +1,253 @@
+import json
+import logging
+
+from django.db import IntegrityError, transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from .models import EncodeJob, EncodeOutput, ReceivedNotification
+from .receivers import collector, send
+from .signals import (
+    transcode_onprogress,
+    transcode_onerror,
+    transcode_oncomplete,
+    transcode_batch_complete
+)
+from .status import update_status
+from .utils import LRUCache
+
+logger = logging.getLogger("dj_elastictranscoder.notifications")
+
+# MessageIds recently applied by this process
+seen_messages = LRUCache(maxsize=10000)
+
+# notification state: (new job state, states it may follow, signal)
+TRANSITIONS = {
+    'PROGRESSING': (
+        EncodeJob.STATE_PROGRESSING,
+        (EncodeJob.STATE_SUBMITTED,),
+        transcode_onprogress,
+    ),
+    'COMPLETED': (
+        EncodeJob.STATE_COMPLETE,
+        (EncodeJob.STATE_SUBMITTED, EncodeJob.STATE_PROGRESSING),
+        transcode_oncomplete,
+    ),
+    'ERROR': (
+        EncodeJob.STATE_ERROR,
+        (EncodeJob.STATE_SUBMITTED, EncodeJob.STATE_PROGRESSING),
+        transcode_onerror,
+    ),
+}
+
+
+def get_job_message(message):
+    if message['state'] == 'PROGRESSING':
+        return 'Progress'
+    if message['state'] == 'COMPLETED':
+        return 'Success'
+
+    try:
+        return message['messageDetails']
+    except KeyError:
+        details = []
+        for output in message["outputs"]:
+            details.append(output["statusDetail"])
+        return json.dumps(details)
+
+
+def has_listeners(signal):
+    if signal is transcode_oncomplete and transcode_batch_complete.has_listeners():
+        return True
+    return signal.has_listeners()
+
+
+def notify(signal, job, message):
+    send(signal, job, message)
+    if signal is transcode_oncomplete and transcode_batch_complete.has_listeners():
+        collector.add(job, message)
+
+
+def jobs_for(job_id):
+    """
+    The job and the duplicates following it
+    """
+    return EncodeJob.objects.filter(Q(pk=job_id) | Q(duplicate_of=job_id))
+
+
+def save_outputs(jobs, by_job):
+    """
+    Replace the ``EncodeOutput`` rows of ``jobs`` with the outputs of their
+    notification in ``by_job`` (keyed by the id of the original job)
+    """
+    ids = []
+    outputs = []
+    for pk, original_id in jobs.values_list('pk', 'duplicate_of'):
+        message = by_job[original_id or pk]
+        if not message.get('outputs'):
+            continue
+        ids.append(pk)
+        for output in message['outputs']:
+            if not output.get('id'):
+                continue
+            outputs.append(EncodeOutput(
+                job_id=pk,
+                output_id=output['id'],
+                key=output.get('key') or '',
+                preset_id=output.get('presetId') or '',
+                status=output.get('status') or '',
+                status_detail=output.get('statusDetail') or '',
+                duration=output.get('duration'),
+                width=output.get('width'),
+                height=output.get('height')))
+
+    if ids:
+        with transaction.atomic():
+            EncodeOutput.objects.filter(job__in=ids).delete()
+            EncodeOutput.objects.bulk_create(outputs)
+
+
+def apply_notification(message):
+    """
+    Apply the state change of an elastic transcoder notification.
+
+    The change is a single conditional UPDATE that only moves jobs forward,
+    so a late PROGRESSING notification never overrides COMPLETED.  Jobs are
+    only read back when the notification has outputs, saved as
+    ``EncodeOutput`` rows, or the signal has receivers.  Returns the number of
+    jobs that changed state.
+    """
+    try:
+        state, predecessors, signal = TRANSITIONS[message['state']]
+    except KeyError:
+        return 0
+
+    job_id = message['jobId']
+    now = timezone.now()
+
+    updated = jobs_for(job_id).filter(state__in=predecessors).update(
+        state=state,
+        message=get_job_message(message),
+        last_modified=now)
+
+    if not updated:
+        # let SNS retry notifications for jobs that are not committed yet
+        if not EncodeJob.objects.filter(pk=job_id).exists():
+            raise EncodeJob.DoesNotExist('EncodeJob "%s" does not exist' % job_id)
+        return 0
+
+    changed = jobs_for(job_id).filter(state=state, last_modified=now)
+    if message.get('outputs'):
+        save_outputs(changed, {job_id: message})
+    update_status(changed.values_list('pk', flat=True), state)
+
+    if has_listeners(signal):
+        for job in changed:
+            notify(signal, job, message)
+
+    return updated
+
+
+def is_job_notification(message):
+    """
+    Whether a decoded notification has what applying it needs
+    """
+    return isinstance(message, dict) and 'state' in message and 'jobId' in message
+
+
+def update_jobs(messages):
+    """
+    Apply a batch of notifications with one UPDATE per target state (and
+    error message) and save the outputs of the jobs that changed, without
+    sending the signals.
+
+    Notifications are applied in the order jobs go through their states, so
+    a PROGRESSING and a COMPLETED of the same job in one batch both count.
+    Returns the set of job ids that do not exist (yet) and the
+    ``(signal, job, message)`` signals to send.
+    """
+    groups = {}
+    for message in messages:
+        if message['state'] not in TRANSITIONS:
+            continue
+        key = (message['state'], get_job_message(message))
+        groups.setdefault(key, {})[message['jobId']] = message
+
+    order = ['PROGRESSING', 'COMPLETED', 'ERROR']
+    now = timezone.now()
+
+    changed = []
+    seen = set()
+    for (notification_state, text), by_job in sorted(groups.items(), key=lambda item: order.index(item[0][0])):
+        state, predecessors, signal = TRANSITIONS[notification_state]
+        job_ids = list(by_job)
+        seen.update(job_ids)
+
+        jobs = EncodeJob.objects.filter(Q(pk__in=job_ids) | Q(duplicate_of__in=job_ids))
+        if jobs.filter(state__in=predecessors).update(state=state, message=text, last_modified=now):
+            changed.append((jobs, state, signal, by_job))
+
+    missing = seen - set(EncodeJob.objects.filter(pk__in=seen).values_list('pk', flat=True))
+
+    for jobs, state, signal, by_job in changed:
+        save_outputs(jobs.filter(state=state, last_modified=now), by_job)
+        update_status(jobs.filter(state=state, last_modified=now).values_list('pk', flat=True), state)
+
+    signals = []
+    for jobs, state, signal, by_job in changed:
+        if not has_listeners(signal):
+            continue
+        for job in jobs.filter(state=state, last_modified=now):
+            signals.append((signal, job, by_job[job.duplicate_of_id or job.pk]))
+
+    return missing, signals
+
+
+def apply_notifications(messages):
+    """
+    Apply a batch of notifications with ``update_jobs()``, then send the
+    signals job by job.  Returns the set of job ids that do not exist (yet).
+    """
+    missing, signals = update_jobs(messages)
+    for signal, job, message in signals:
+        notify(signal, job, message)
+    return missing
+
+
+def notify_all(signals):
+    """
+    Send the ``(signal, job, message)`` signals returned by ``update_jobs()``
+    once they are committed, logging the receivers that fail so they neither
+    roll back nor hold up the rest of the batch
+    """
+    for signal, job, message in signals:
+        try:
+            notify(signal, job, message)
+        except Exception:
+            logger.exception("Receiver failed for the notification of job %s", job.pk)
+
+
+def process_once(message_id, func, *args, **kwargs):
+    """
+    Call ``func`` unless the notification ``message_id`` was already processed,
+    returning False for duplicates.
+
+    Recent ids are remembered in process, older ones in ``ReceivedNotification``
+    whose row is written in the same transaction as ``func``, so a failed
+    notification is not mistaken for a duplicate when SNS sends it again.
+    """
+    if message_id in seen_messages:
+        return False
+
+    with transaction.atomic():
+        try:
+            with transaction.atomic():
+                ReceivedNotification.objects.create(message_id=message_id)
+        except IntegrityError:
+            seen_messages.set(message_id, True)
+            return False
+
+        func(*args, **kwargs)
+
+    seen_messages.set(message_id, True)
+    return True
@@ -0,0 +1,118 @@
+import json
+import logging
+from datetime import timedelta
+from uuid import uuid4
+
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from .models import EncodeJob, EncodeRequest
+from .status import set_status
+from .transcoder import Transcoder
+
+logger = logging.getLogger("dj_elastictranscoder.outbox")
+
+def claim_requests(batch_size=100, claim_timeout=300):
+    """
+    Claim up to ``batch_size`` pending outbox rows for this worker.
+
+    Rows are claimed with a conditional UPDATE so concurrent workers never
+    get the same row.  Rows claimed more than ``claim_timeout`` seconds ago by
+    a worker that never finished them are claimed again, so ``claim_timeout``
+    must be longer than the slowest batch (including rate limiting and
+    throttling backoff) or the rows of a live worker are submitted twice.
+    """
+    now = timezone.now()
+    claimable = Q(state=EncodeRequest.STATE_PENDING) | Q(
+        state=EncodeRequest.STATE_CLAIMED,
+        last_modified__lt=now - timedelta(seconds=claim_timeout))
+
+    ids = list(EncodeRequest.objects.filter(claimable)
+        .order_by('created_at')
+        .values_list('pk', flat=True)[:batch_size])
+    if not ids:
+        return []
+
+    claim = uuid4().hex
+    EncodeRequest.objects.filter(claimable, pk__in=ids).update(
+        state=EncodeRequest.STATE_CLAIMED, claim=claim, last_modified=now)
+
+    return list(EncodeRequest.objects.filter(state=EncodeRequest.STATE_CLAIMED, claim=claim))
+
+
+def claimed(request):
+    """
+    The row of ``request``, as long as it is still claimed by this worker
+    """
+    return EncodeRequest.objects.filter(pk=request.pk, claim=request.claim, state=EncodeRequest.STATE_CLAIMED)
+
+
+def process_requests(requests, max_workers=None, max_attempts=5):
+    """
+    Submit claimed outbox rows and link the accepted ones to new ``EncodeJob`` rows.
+
+    Rows are only updated while this worker still holds their claim; the
+    rows claimed again by another worker meanwhile are left to it.  Returns a
+    ``(submitted, failed)`` tuple of counts.
+    """
+    by_pipeline = {}
+    for request in requests:
+        by_pipeline.setdefault((request.pipeline_id, request.region), []).append(request)
+
+    submitted = failed = 0
+    for (pipeline_id, region), pipeline_requests in by_pipeline.items():
+        transcoder = Transcoder(pipeline_id, region or None)
+
+        items = []
+        for request in pipeline_requests:
+            item = (request, json.loads(request.input), json.loads(request.outputs))
+            if request.playlists:
+                item += (json.loads(request.playlists),)
+            items.append(item)
+
+        jobs = []
+        errors = []
+        for request, message, error in transcoder.submit_many(items, max_workers):
+            if error is not None:
+                errors.append((request, error))
+                continue
+
+            job = EncodeJob()
+            job.id = message['Job']['Id']
+            job.content_type_id = request.content_type_id
+            job.object_id = request.object_id
+            job.pipeline_id = pipeline_id
+            jobs.append((request, job))
+
+        with transaction.atomic():
+            EncodeJob.objects.bulk_create([job for request, job in jobs])
+            created = []
+            lost = []
+            for request, job in jobs:
+                if claimed(request).update(
+                        state=EncodeRequest.STATE_SUBMITTED, job=job, error='',
+                        attempts=request.attempts + 1, last_modified=timezone.now()):
+                    created.append(job)
+                else:
+                    logger.warning("Outbox row %s was claimed again while job %s was submitted for it",
+                                   request.pk, job.pk)
+                    lost.append(job.pk)
+            if lost:
+                EncodeJob.objects.filter(pk__in=lost).delete()
+            set_status(created)
+
+            for request, error in errors:
+                attempts = request.attempts + 1
+                if attempts >= max_attempts:
+                    state = EncodeRequest.STATE_FAILED
+                else:
+                    state = EncodeRequest.STATE_PENDING
+                if claimed(request).update(
+                        state=state, error='%s: %s' % (error.__class__.__name__, error),
+                        attempts=attempts, last_modified=timezone.now()):
+                    failed += 1
+
+        submitted += len(created)
+
+    return submitted, failed
@@ -0,0 +1,139 @@
+import random
+import threading
+import time
+
+from django.conf import settings
+
+
+THROTTLING_ERROR_CODES = ('Throttling', 'ThrottlingException', 'RequestLimitExceeded')
+
+
+def is_throttling_error(e):
+    if getattr(e, 'status', None) == 429:
+        return True
+    return getattr(e, 'error_code', None) in THROTTLING_ERROR_CODES
+
+
+class RateLimiter(object):
+    """
+    Token bucket with AIMD rate adaptation.
+
+    Requests are paced to ``rate`` per second with up to ``burst`` requests in
+    a row.  Each throttling error halves the current rate (at most once per
+    ``cooldown`` seconds so a burst of rejections counts once), each success
+    adds ``increase`` back until the configured rate is reached again.  Throttled
+    calls are retried after a "full jitter" exponential backoff so workers that
+    were rejected together do not come back together.
+
+    When ``rate`` is None requests are not paced but throttled calls are
+    still retried.
+    """
+    decrease = 0.5
+    cooldown = 1.0
+    backoff_base = 0.1
+    backoff_cap = 20.0
+
+    def __init__(self, rate=None, burst=None, increase=None, max_retries=5,
+                 clock=time.time, sleep=time.sleep):
+        if rate:
+            rate = float(rate)
+        self.rate = rate
+        self.current_rate = rate
+        self.burst = float(burst or rate or 1)
+        self.increase = increase if increase is not None else (rate or 0) / 20.0
+        self.min_rate = (rate or 0) / 100.0
+        self.max_retries = max_retries
+        self.clock = clock
+        self.sleep = sleep
+
+        self.tokens = self.burst
+        self.updated = clock()
+        self.last_decrease = None
+        self.lock = threading.Lock()
+
+    def _refill(self, now):
+        elapsed = max(0, now - self.updated)
+        self.tokens = min(self.burst, self.tokens + elapsed * self.current_rate)
+        self.updated = now
+
+    def acquire(self):
+        """
+        Block until a request may be sent
+        """
+        if not self.rate:
+            return
+
+        with self.lock:
+            now = self.clock()
+            self._refill(now)
+            self.tokens -= 1
+            wait = -self.tokens / self.current_rate if self.tokens < 0 else 0
+
+        if wait:
+            self.sleep(wait)
+
+    def throttled(self):
+        if not self.rate:
+            return
+
+        with self.lock:
+            now = self.clock()
+            if self.last_decrease is not None and now - self.last_decrease < self.cooldown:
+                return
+            self._refill(now)
+            self.current_rate = max(self.min_rate, self.current_rate * self.decrease)
+            self.last_decrease = now
+
+    def succeeded(self):
+        if not self.rate or self.current_rate >= self.rate:
+            return
+
+        with self.lock:
+            self._refill(self.clock())
+            self.current_rate = min(self.rate, self.current_rate + self.increase)
+
+    def backoff(self, attempt):
+        return random.uniform(0, min(self.backoff_cap, self.backoff_base * 2 ** attempt))
+
+    def call(self, func, *args, **kwargs):
+        attempt = 0
+        while True:
+            self.acquire()
+            try:
+                result = func(*args, **kwargs)
+            except Exception as e:
+                if not is_throttling_error(e):
+                    raise
+                self.throttled()
+                if attempt >= self.max_retries:
+                    raise
+                self.sleep(self.backoff(attempt))
+                attempt += 1
+            else:
+                self.succeeded()
+                return result
+
+
+_limiter = None
+_limiter_lock = threading.Lock()
+
+
+def get_limiter():
+    """
+    Return the limiter shared by every ``Transcoder`` in the process
+    """
+    global _limiter
+    with _limiter_lock:
+        if _limiter is None:
+            _limiter = RateLimiter(
+                rate=getattr(settings, 'ELASTIC_TRANSCODER_RATE_LIMIT', None),
+                burst=getattr(settings, 'ELASTIC_TRANSCODER_RATE_BURST', None),
+                max_retries=getattr(settings, 'ELASTIC_TRANSCODER_MAX_RETRIES', 5),
+            )
+        return _limiter
+
+
+def reset_limiter():
+    global _limiter
+    with _limiter_lock:
+        _limiter = None
@@ -0,0 +1,131 @@
+import atexit
+import logging
+import threading
+import time
+
+from django.conf import settings
+from django.db import connection
+
+from .signals import transcode_batch_complete
+from .utils import SharedPool
+
+logger = logging.getLogger("dj_elastictranscoder.receivers")
+
+
+def background(receiver):
+    """
+    Mark a signal receiver to run on the background pool when
+    ELASTIC_TRANSCODER_SIGNAL_DISPATCH is "pool"
+
+        @receiver(transcode_oncomplete)
+        @background
+        def purge_cdn(sender, job, message, **kwargs):
+            ...
+    """
+    receiver.transcode_background = True
+    return receiver
+
+
+# runs the ``@background`` receivers
+executor = SharedPool('ELASTIC_TRANSCODER_SIGNAL_WORKERS', 4, 'ELASTIC_TRANSCODER_SIGNAL_QUEUE', 1000)
+
+
+def call_receiver(receiver, signal, job, message):
+    start = time.time()
+    try:
+        receiver(signal=signal, sender=None, job=job, message=message)
+    except Exception:
+        logger.exception("Receiver %r failed for job %s", receiver, job.pk)
+    finally:
+        logger.debug("Receiver %r took %.3fs for job %s", receiver, time.time() - start, job.pk)
+
+
+def call_in_background(receiver, signal, job, message):
+    try:
+        call_receiver(receiver, signal, job, message)
+    finally:
+        connection.close()
+
+
+def send(signal, job, message):
+    """
+    Send a transcode signal.
+
+    By default this is ``signal.send()``.  When ELASTIC_TRANSCODER_SIGNAL_DISPATCH
+    is "pool" every receiver is timed and its exceptions are logged instead of
+    propagated, and receivers marked with ``@background`` are queued on a
+    pool of ELASTIC_TRANSCODER_SIGNAL_WORKERS threads so they do not delay the
+    response to SNS.  Once ELASTIC_TRANSCODER_SIGNAL_QUEUE receivers are
+    waiting there, the next ones run inline.
+    """
+    if getattr(settings, 'ELASTIC_TRANSCODER_SIGNAL_DISPATCH', 'sync') != 'pool':
+        signal.send(sender=None, job=job, message=message)
+        return
+
+    for receiver in signal._live_receivers(None):
+        if getattr(receiver, 'transcode_background', False):
+            if executor.defer(call_in_background, receiver, signal, job, message):
+                continue
+        call_receiver(receiver, signal, job, message)
+
+
+class BatchCollector(object):
+    """
+    Collect completed jobs and send them together with
+    ``transcode_batch_complete`` once ``size`` jobs are waiting or ``window``
+    seconds after the first one arrived
+    """
+    def __init__(self, size=None, window=None):
+        self.size = size
+        self.window = window
+        self.pending = []
+        self.timer = None
+        self.lock = threading.Lock()
+
+    def get_size(self):
+        if self.size is not None:
+            return self.size
+        return getattr(settings, 'ELASTIC_TRANSCODER_BATCH_SIZE', 100)
+
+    def get_window(self):
+        if self.window is not None:
+            return self.window
+        return getattr(settings, 'ELASTIC_TRANSCODER_BATCH_WINDOW', 5)
+
+    def add(self, job, message):
+        with self.lock:
+            self.pending.append((job, message))
+            full = len(self.pending) >= self.get_size()
+            if not full and self.timer is None:
+                self.timer = threading.Timer(self.get_window(), self.flush_in_background)
+                self.timer.daemon = True
+                self.timer.start()
+
+        if full:
+            self.flush()
+
+    def flush(self):
+        with self.lock:
+            jobs, self.pending = self.pending, []
+            if self.timer is not None:
+                self.timer.cancel()
+                self.timer = None
+
+        if not jobs:
+            return
+
+        for receiver in transcode_batch_complete._live_receivers(None):
+            try:
+                receiver(signal=transcode_batch_complete, sender=None, jobs=jobs)
+            except Exception:
+                logger.exception("Receiver %r failed for a batch of %d jobs", receiver, len(jobs))
+
+    def flush_in_background(self):
+        try:
+            self.flush()
+        finally:
+            connection.close()
+
+
+collector = BatchCollector()
+atexit.register(collector.flush)
@@ -0,0 +1,234 @@
+import calendar
+import logging
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from .connections import get_connection
+from .models import EncodeJob
+from .notifications import notify_all, update_jobs
+from .ratelimit import get_limiter
+from .transcoder import Transcoder
+
+logger = logging.getLogger("dj_elastictranscoder.reconcile")
+
+# elastic transcoder job status: notification state
+STATES = {
+    'Progressing': 'PROGRESSING',
+    'Complete': 'COMPLETED',
+    'Error': 'ERROR',
+    'Canceled': 'ERROR',
+}
+
+
+def get_region(pipeline_id):
+    """
+    Region of ``pipeline_id`` according to ELASTIC_TRANSCODER_REGIONS,
+    defaulting to AWS_REGION
+    """
+    for config in getattr(settings, 'ELASTIC_TRANSCODER_REGIONS', []):
+        if config['pipeline_id'] == pipeline_id:
+            return config['region']
+    return getattr(settings, 'AWS_REGION', None)
+
+
+def stale_jobs(stale_after):
+    """
+    Active jobs that did not change for ``stale_after`` seconds.  Duplicates
+    follow their original job and are left out.
+    """
+    return EncodeJob.objects.filter(
+        state__in=EncodeJob.ACTIVE_STATES,
+        last_modified__lt=timezone.now() - timedelta(seconds=stale_after),
+        duplicate_of__isnull=True)
+
+
+def to_message(job):
+    """
+    Notification equivalent to the status of an elastic transcoder job
+    """
+    message = {
+        'state': STATES[job['Status']],
+        'jobId': job['Id'],
+        'pipelineId': job.get('PipelineId'),
+        'outputs': [{
+            'id': output.get('Id'),
+            'key': output.get('Key'),
+            'presetId': output.get('PresetId'),
+            'status': output.get('Status'),
+            'statusDetail': output.get('StatusDetail') or '',
+            'duration': output.get('Duration'),
+            'width': output.get('Width'),
+            'height': output.get('Height'),
+        } for output in job.get('Outputs') or [job.get('Output') or {}]],
+    }
+    if job['Status'] == 'Canceled':
+        message['messageDetails'] = 'Canceled'
+    elif job['Status'] == 'Error':
+        message['messageDetails'] = '; '.join(o['statusDetail'] for o in message['outputs'] if o['statusDetail'])
+    return message
+
+
+def submitted_before(job, oldest):
+    try:
+        millis = job['Timing']['SubmitTimeMillis']
+    except (KeyError, TypeError):
+        return False
+    return millis < calendar.timegm(oldest.utctimetuple()) * 1000
+
+
+def corrections(stale, jobs):
+    """
+    Notifications correcting the ``stale`` jobs among ``jobs``, elastic
+    transcoder jobs by id
+    """
+    for pk, state in stale.filter(pk__in=list(jobs)).values_list('pk', 'state'):
+        message = to_message(jobs[pk])
+        if message['state'] == 'PROGRESSING' and state != EncodeJob.STATE_SUBMITTED:
+            continue
+        yield message
+
+
+def apply_corrections(messages):
+    with transaction.atomic():
+        missing, signals = update_jobs(messages)
+    # once committed, so a failing receiver does not abort the run
+    notify_all(signals)
+
+
+def scan_pipeline(pipeline_id, stale, connection, batch_size=500, backfill=False):
+    """
+    Correct the ``stale`` jobs found in the job list of ``pipeline_id``,
+    returning ``(checked, corrected)``.  With ``backfill`` the jobs found
+    are also saved with ``pipeline_id``.
+
+    Jobs are listed newest first, a page at a time through the rate limiter,
+    until the pages reach the oldest stale job, and corrections are applied in
+    batches of ``batch_size`` notifications.
+    """
+    oldest = stale.order_by('created_at').values_list('created_at', flat=True)[:1]
+    if not oldest:
+        return 0, 0
+    # created_at is saved a moment after elastic transcoder received the job
+    oldest = oldest[0] - timedelta(minutes=5)
+    if timezone.is_naive(oldest):
+        oldest = timezone.make_aware(oldest, timezone.get_default_timezone())
+
+    limiter = get_limiter()
+
+    checked = corrected = 0
+    messages = []
+
+    page_token = None
+    while True:
+        page = limiter.call(connection.list_jobs_by_pipeline, pipeline_id, ascending='false', page_token=page_token)
+        jobs = dict((job['Id'], job) for job in page.get('Jobs', []) if job.get('Status') in STATES)
+        checked += len(page.get('Jobs', []))
+
+        if jobs:
+            for message in corrections(stale, jobs):
+                messages.append(message)
+                corrected += 1
+
+            if len(messages) >= batch_size:
+                apply_corrections(messages)
+                messages = []
+
+        if backfill and page.get('Jobs'):
+            stale.filter(pk__in=[job['Id'] for job in page['Jobs']]).update(pipeline_id=pipeline_id)
+
+        page_token = page.get('NextPageToken')
+        if not page_token or any(submitted_before(job, oldest) for job in page.get('Jobs', [])):
+            break
+
+    if messages:
+        apply_corrections(messages)
+
+    return checked, corrected
+
+
+def reconcile_pipeline(pipeline_id, stale, connection=None, batch_size=500):
+    """
+    Bring the ``stale`` jobs of ``pipeline_id`` up to date with the status
+    elastic transcoder reports for them, returning ``(checked, corrected)``
+    """
+    if connection is None:
+        connection = Transcoder(pipeline_id, get_region(pipeline_id)).get_connection()
+    return scan_pipeline(pipeline_id, stale.filter(pipeline_id=pipeline_id), connection, batch_size)
+
+
+def list_pipelines(connection):
+    limiter = get_limiter()
+    page_token = None
+    while True:
+        page = limiter.call(connection.list_pipelines, page_token=page_token)
+        for pipeline in page.get('Pipelines', []):
+            yield pipeline['Id']
+        page_token = page.get('NextPageToken')
+        if not page_token:
+            break
+
+
+def reconcile_unassigned(stale, connection=None, batch_size=500):
+    """
+    Bring the ``stale`` jobs saved without a ``pipeline_id`` up to date by
+    scanning the job lists of every pipeline of the AWS_REGION region,
+    returning ``(checked, corrected)``.
+
+    The jobs found are saved with their pipeline, so the next runs reconcile
+    them with ``reconcile_pipeline()``.  A pipeline that fails is logged and
+    the others are still scanned.
+    """
+    stale = stale.filter(pipeline_id='')
+    if not stale.exists():
+        return 0, 0
+
+    if connection is None:
+        connection = get_connection(
+            'elastictranscoder',
+            settings.AWS_REGION,
+            settings.AWS_ACCESS_KEY_ID,
+            settings.AWS_SECRET_ACCESS_KEY)
+
+    checked = corrected = 0
+    for pipeline_id in list(list_pipelines(connection)):
+        try:
+            pipeline_checked, pipeline_corrected = scan_pipeline(
+                pipeline_id, stale, connection, batch_size, backfill=True)
+        except Exception:
+            logger.exception("Reconciling jobs without a pipeline in pipeline %s failed", pipeline_id)
+            continue
+        checked += pipeline_checked
+        corrected += pipeline_corrected
+    return checked, corrected
+
+
+def reconcile(stale_after=3600, batch_size=500):
+    """
+    Reconcile the stale jobs of every pipeline, then the ones saved without
+    a pipeline, returning ``(checked, corrected)``.  A pipeline that fails is
+    logged and the others are still reconciled.
+    """
+    stale = stale_jobs(stale_after)
+    pipelines = stale.exclude(pipeline_id='').order_by().values_list('pipeline_id', flat=True).distinct()
+
+    checked = corrected = 0
+    for pipeline_id in list(pipelines):
+        try:
+            pipeline_checked, pipeline_corrected = reconcile_pipeline(pipeline_id, stale, batch_size=batch_size)
+        except Exception:
+            logger.exception("Reconciling pipeline %s failed", pipeline_id)
+            continue
+        checked += pipeline_checked
+        corrected += pipeline_corrected
+
+    try:
+        unassigned_checked, unassigned_corrected = reconcile_unassigned(stale, batch_size=batch_size)
+    except Exception:
+        logger.exception("Reconciling jobs without a pipeline failed")
+    else:
+        checked += unassigned_checked
+        corrected += unassigned_corrected
+    return checked, corrected
@@ -3,3 +3,6 @@ from django.dispatch import Signal
 transcode_onprogress = Signal(providing_args=["job", "message"])
 transcode_onerror = Signal(providing_args=["job", "message"])
 transcode_oncomplete = Signal(providing_args=["job", "message"])
+
+# list of (job, message) pairs of jobs completed within a short window
+transcode_batch_complete = Signal(providing_args=["jobs"])
@@ -0,0 +1,147 @@
+import base64
+import hashlib
+import re
+from urllib2 import urlopen
+from urlparse import urlparse
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+
+from .metadata import get_cache
+from .utils import LRUCache
+
+try:
+    from cryptography import x509
+    from cryptography.exceptions import InvalidSignature
+    from cryptography.hazmat.backends import default_backend
+    from cryptography.hazmat.primitives import hashes
+    from cryptography.hazmat.primitives.asymmetric import padding
+except ImportError:
+    x509 = None
+
+
+SIGNING_CERT_HOST = r'^sns\.[a-z0-9-]+\.amazonaws\.com(\.cn)?$'
+
+SIGNED_KEYS = {
+    'Notification': ('Message', 'MessageId', 'Subject', 'Timestamp', 'TopicArn', 'Type'),
+    'SubscriptionConfirmation': ('Message', 'MessageId', 'SubscribeURL', 'Timestamp', 'Token', 'TopicArn', 'Type'),
+    'UnsubscribeConfirmation': ('Message', 'MessageId', 'SubscribeURL', 'Timestamp', 'Token', 'TopicArn', 'Type'),
+}
+
+# parsed public keys by SigningCertURL
+public_keys = LRUCache(maxsize=32)
+
+
+class SignatureError(Exception):
+    pass
+
+
+def get_string_to_sign(data):
+    try:
+        keys = SIGNED_KEYS[data['Type']]
+    except KeyError:
+        raise SignatureError('Unknown message type "%s"' % data.get('Type'))
+
+    parts = []
+    for key in keys:
+        # Subject is the only optional key
+        if key not in data and key == 'Subject':
+            continue
+        parts.append(u'%s\n%s\n' % (key, data[key]))
+    return u''.join(parts).encode('utf-8')
+
+
+def check_certificate_url(url):
+    host = getattr(settings, 'ELASTIC_TRANSCODER_SIGNING_CERT_HOST', SIGNING_CERT_HOST)
+
+    parsed = urlparse(url)
+    if parsed.scheme != 'https' or not re.match(host, parsed.hostname or ''):
+        raise SignatureError('Untrusted SigningCertURL "%s"' % url)
+
+
+def download_certificate(url):
+    return urlopen(url, timeout=10).read()
+
+
+def get_public_key(url):
+    """
+    Public key of the signing certificate, looked up in the process LRU, then
+    in the shared cache (as PEM) and only downloaded when both miss
+    """
+    key = public_keys.get(url)
+    if key is not None:
+        return key
+
+    check_certificate_url(url)
+
+    cache = get_cache()
+    cache_key = 'dj_elastictranscoder:cert:%s' % hashlib.sha1(url).hexdigest()
+    pem = cache.get(cache_key)
+    if pem is None:
+        pem = download_certificate(url)
+        cache.set(cache_key, pem, getattr(settings, 'ELASTIC_TRANSCODER_SIGNING_CERT_TIMEOUT', 86400))
+
+    key = x509.load_pem_x509_certificate(pem, default_backend()).public_key()
+    public_keys.set(url, key)
+    return key
+
+
+def get_allowed_topics():
+    """
+    ELASTIC_TRANSCODER_ALLOWED_TOPICS, defaulting to ELASTIC_TRANSCODER_TOPIC_ARN
+    """
+    topics = getattr(settings, 'ELASTIC_TRANSCODER_ALLOWED_TOPICS', None)
+    if topics is None:
+        topic = getattr(settings, 'ELASTIC_TRANSCODER_TOPIC_ARN', None)
+        topics = [topic] if topic else []
+    return topics
+
+
+def check_topic(data):
+    """
+    Anyone can have SNS sign messages of their own topic, so notifications
+    and subscriptions are only accepted from the allowed topics
+    """
+    if data.get('Type') not in ('Notification', 'SubscriptionConfirmation'):
+        return
+
+    topics = get_allowed_topics()
+    if not topics:
+        raise ImproperlyConfigured('Verifying SNS signatures requires ELASTIC_TRANSCODER_TOPIC_ARN '
+                                   'or ELASTIC_TRANSCODER_ALLOWED_TOPICS')
+    if data.get('TopicArn') not in topics:
+        raise SignatureError('Untrusted TopicArn "%s"' % data.get('TopicArn'))
+
+
+def verify(data):
+    """
+    Check the signature of a decoded SNS message, raising ``SignatureError``
+    if it was not signed by SNS or comes from a topic that is not allowed
+    """
+    if x509 is None:
+        raise ImproperlyConfigured('Verifying SNS signatures requires the "cryptography" package')
+
+    if data.get('SignatureVersion') == '1':
+        algorithm = hashes.SHA1()
+    elif data.get('SignatureVersion') == '2':
+        algorithm = hashes.SHA256()
+    else:
+        raise SignatureError('Unsupported SignatureVersion "%s"' % data.get('SignatureVersion'))
+
+    try:
+        signature = base64.b64decode(data['Signature'])
+        url = data['SigningCertURL']
+    except (KeyError, TypeError):
+        raise SignatureError('Message is not signed')
+
+    try:
+        string_to_sign = get_string_to_sign(data)
+    except KeyError as e:
+        raise SignatureError('Signed key %s is missing' % e)
+
+    try:
+        get_public_key(url).verify(signature, string_to_sign, padding.PKCS1v15(), algorithm)
+    except InvalidSignature:
+        raise SignatureError('Invalid signature')
+
+    check_topic(data)
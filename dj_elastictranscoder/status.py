@@ -0,0 +1,175 @@
+from collections import OrderedDict
+
+from django.conf import settings
+from django.contrib.contenttypes.models import ContentType
+from django.db import IntegrityError, transaction
+from django.db.models import Q
+
+from .metadata import get_cache
+from .models import EncodeJob, EncodeStatus
+
+# cached for objects without jobs, get_many() leaves them out
+NO_JOB = -1
+
+# cached for a few seconds after a state change, read as a miss
+INVALIDATED = -2
+INVALIDATED_TIMEOUT = 10
+
+
+def is_enabled():
+    return getattr(settings, 'ELASTIC_TRANSCODER_STATUS_CACHE', False)
+
+
+def get_timeout():
+    return getattr(settings, 'ELASTIC_TRANSCODER_STATUS_TIMEOUT', 86400)
+
+
+def status_key(content_type_id, object_id):
+    return 'dj_elastictranscoder:status:%s:%s' % (content_type_id, object_id)
+
+
+def object_key(obj):
+    return ContentType.objects.get_for_model(obj).pk, obj.pk
+
+
+def save_status(key, job):
+    with transaction.atomic():
+        updated = EncodeStatus.objects.filter(content_type=key[0], object_id=key[1]).update(
+            job=job, state=job.state)
+        if not updated:
+            try:
+                with transaction.atomic():
+                    EncodeStatus.objects.create(content_type_id=key[0], object_id=key[1], job=job, state=job.state)
+            except IntegrityError:
+                # created concurrently for the same object
+                EncodeStatus.objects.filter(content_type=key[0], object_id=key[1]).update(
+                    job=job, state=job.state)
+
+
+def set_status(jobs):
+    """
+    Make ``jobs`` the current job of their objects, when they were just
+    created.  The rows are replaced with one DELETE per content type and a
+    single INSERT.
+    """
+    if not is_enabled():
+        return
+
+    latest = OrderedDict()
+    for job in jobs:
+        latest[(job.content_type_id, job.object_id)] = job
+    if not latest:
+        return
+
+    by_type = {}
+    for content_type_id, object_id in latest:
+        by_type.setdefault(content_type_id, []).append(object_id)
+
+    try:
+        with transaction.atomic():
+            for content_type_id, object_ids in by_type.items():
+                EncodeStatus.objects.filter(content_type=content_type_id, object_id__in=object_ids).delete()
+            EncodeStatus.objects.bulk_create([
+                EncodeStatus(content_type_id=key[0], object_id=key[1], job=job, state=job.state)
+                for key, job in latest.items()])
+    except IntegrityError:
+        # some were created concurrently, save them one by one
+        for key, job in latest.items():
+            save_status(key, job)
+
+    get_cache().set_many(dict((status_key(*key), job.state) for key, job in latest.items()), get_timeout())
+
+
+def update_status(job_ids, state):
+    """
+    Record the new ``state`` of ``job_ids`` for the objects they are the
+    current job of
+    """
+    if not is_enabled():
+        return
+
+    statuses = EncodeStatus.objects.filter(job__in=list(job_ids))
+    if not statuses.update(state=state):
+        return
+
+    # another job may have become current since the update, so the keys are
+    # not set to ``state``.  They are marked as invalidated for a little
+    # while instead of deleted, so that a reader that read the old state
+    # before the update cannot add() it back.
+    keys = statuses.values_list('content_type', 'object_id')
+    get_cache().set_many(dict((status_key(*key), INVALIDATED) for key in keys), INVALIDATED_TIMEOUT)
+
+
+def get_many(objs):
+    """
+    State of the latest job of each of ``objs`` as a dict of object: state,
+    leaving out the objects without jobs.
+
+    With ELASTIC_TRANSCODER_STATUS_CACHE the states are read from the cache
+    in one round trip, then from ``EncodeStatus`` for the objects missing
+    there, and only then from their jobs (saving them in ``EncodeStatus``).
+    Objects without jobs are cached as such until their first job is created.
+    """
+    objs = list(objs)
+    if not is_enabled():
+        return dict((obj, job.state) for obj, job in EncodeJob.objects.latest_for_objects(objs).items())
+
+    keys = dict((obj, object_key(obj)) for obj in objs)
+    cache = get_cache()
+    cached = cache.get_many([status_key(*key) for key in keys.values()])
+
+    states = {}
+    missing = []
+    for obj, key in keys.items():
+        state = cached.get(status_key(*key), INVALIDATED)
+        if state == INVALIDATED:
+            missing.append(obj)
+        elif state != NO_JOB:
+            states[obj] = state
+    if not missing:
+        return states
+
+    query = Q()
+    for obj in missing:
+        query |= Q(content_type=keys[obj][0], object_id=keys[obj][1])
+    stored = dict(((ct, pk), state) for ct, pk, state in
+                  EncodeStatus.objects.filter(query).values_list('content_type', 'object_id', 'state'))
+
+    found = {}
+    unknown = []
+    for obj in missing:
+        if keys[obj] in stored:
+            states[obj] = found[status_key(*keys[obj])] = stored[keys[obj]]
+        else:
+            unknown.append(obj)
+
+    # jobs created before the status cache was enabled
+    latest = EncodeJob.objects.latest_for_objects(unknown) if unknown else {}
+    if latest:
+        try:
+            with transaction.atomic():
+                EncodeStatus.objects.bulk_create([
+                    EncodeStatus(content_type_id=job.content_type_id, object_id=job.object_id, job=job, state=job.state)
+                    for job in latest.values()])
+        except IntegrityError:
+            pass
+        for obj, job in latest.items():
+            states[obj] = found[status_key(*keys[obj])] = job.state
+
+    for obj in unknown:
+        if obj not in latest:
+            found[status_key(*keys[obj])] = NO_JOB
+
+    # add() so that a state written meanwhile by set_status(), or the mark
+    # of update_status(), is kept
+    timeout = get_timeout()
+    for key, state in found.items():
+        cache.add(key, state, timeout)
+    return states
+
+
+def get_status(obj):
+    """
+    State of the latest job of ``obj``, None without jobs
+    """
+    return get_many([obj]).get(obj)
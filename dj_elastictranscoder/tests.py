@@ -1,12 +1,14 @@
 import os.path
 import json
+import unittest
 
 from django.test import TestCase
+from django.test.utils import override_settings
 from django.dispatch import receiver
 from django.db import models
 from django.contrib.contenttypes.models import ContentType
 
-from .models import EncodeJob
+from .models import BufferedNotification, EncodeJob, EncodeRequest, PendingConfirmation, ReceivedNotification
 from .signals import (
     transcode_onprogress, 
     transcode_onerror, 
@@ -100,6 +102,287 @@ class SNSNotificationTest(TestCase):
         self.assertEqual(job.state, 4)
 
 
+    def test_duplicates(self):
+        item = Item.objects.create(name='Copy')
+        duplicate = EncodeJob.objects.create(
+            id='%s-copy' % self.job_id,
+            content_type=ContentType.objects.get_for_model(Item),
+            object_id=item.id,
+            duplicate_of=self.job)
+
+        with open(os.path.join(FIXTURE_DIRS, 'onprogress.json')) as f:
+            content = f.read()
+
+        resp = self.client.post('/endpoint/', content, content_type="application/json")
+        self.assertEqual(resp.status_code, 200)
+
+        duplicate = EncodeJob.objects.get(pk=duplicate.pk)
+        self.assertEqual(EncodeJob.STATE_PROGRESSING, duplicate.state)
+
+
+    def test_out_of_order(self):
+        from .notifications import apply_notification
+
+        self.job.state = EncodeJob.STATE_COMPLETE
+        self.job.save()
+
+        with open(os.path.join(FIXTURE_DIRS, 'onprogress.json')) as f:
+            message = json.loads(json.loads(f.read())['Message'])
+
+        self.assertEqual(0, apply_notification(message))
+        self.assertEqual(EncodeJob.STATE_COMPLETE, EncodeJob.objects.get(id=self.job_id).state)
+
+    def test_unknown_job(self):
+        from .notifications import apply_notification
+
+        with open(os.path.join(FIXTURE_DIRS, 'onprogress.json')) as f:
+            message = json.loads(json.loads(f.read())['Message'])
+        message['jobId'] = 'unknown'
+
+        self.assertRaises(EncodeJob.DoesNotExist, apply_notification, message)
+
+
+    @override_settings(ELASTIC_TRANSCODER_NOTIFICATION_MODE='buffered')
+    def test_buffered(self):
+        from django.core.management import call_command
+        from StringIO import StringIO
+
+        for name in ('onprogress.json', 'onerror.json'):
+            with open(os.path.join(FIXTURE_DIRS, name)) as f:
+                resp = self.client.post('/endpoint/', f.read(), content_type="application/json")
+            self.assertEqual(resp.status_code, 200)
+
+        self.assertEqual(0, EncodeJob.objects.get(id=self.job_id).state)
+        self.assertEqual(2, BufferedNotification.objects.count())
+
+        call_command('flush_encoder_notifications', once=True, stdout=StringIO())
+
+        self.assertEqual(0, BufferedNotification.objects.count())
+        self.assertEqual(EncodeJob.STATE_ERROR, EncodeJob.objects.get(id=self.job_id).state)
+
+    def test_deferred(self):
+        from . import views
+
+        class InlineExecutor(object):
+            def apply_async(self, func, args):
+                func(*args)
+
+        default, views.executor.pool = views.executor.pool, InlineExecutor()
+        try:
+            with open(os.path.join(FIXTURE_DIRS, 'oncomplete.json')) as f:
+                resp = self.client.post('/endpoint/deferred/', f.read(), content_type="application/json")
+            self.assertEqual(resp.status_code, 200)
+            self.assertEqual(resp.content, 'Accepted')
+            self.assertEqual(4, EncodeJob.objects.get(id=self.job_id).state)
+            self.assertEqual(0, BufferedNotification.objects.count())
+
+            # notifications failing in the background stay buffered for a retry
+            EncodeJob.objects.all().delete()
+            with open(os.path.join(FIXTURE_DIRS, 'onprogress.json')) as f:
+                resp = self.client.post('/endpoint/deferred/', f.read(), content_type="application/json")
+            self.assertEqual(resp.status_code, 200)
+            self.assertEqual(1, BufferedNotification.objects.count())
+
+            # as do the ones that do not fit in the queue
+            with override_settings(ELASTIC_TRANSCODER_ENDPOINT_QUEUE=0):
+                with open(os.path.join(FIXTURE_DIRS, 'onerror.json')) as f:
+                    resp = self.client.post('/endpoint/deferred/', f.read(), content_type="application/json")
+            self.assertEqual(resp.status_code, 200)
+            self.assertEqual(2, BufferedNotification.objects.count())
+            self.assertEqual(0, views.executor.queued)
+
+            resp = self.client.post('/endpoint/deferred/', 'not json', content_type="application/json")
+            self.assertEqual(resp.status_code, 400)
+        finally:
+            views.executor.pool = default
+
+    def test_shed(self):
+        from . import admission
+
+        default, admission._controller = admission._controller, admission.AdmissionController(max_inflight=0)
+        try:
+            with open(os.path.join(FIXTURE_DIRS, 'oncomplete.json')) as f:
+                resp = self.client.post('/endpoint/', f.read(), content_type="application/json")
+        finally:
+            admission._controller = default
+
+        self.assertEqual(resp.status_code, 503)
+        self.assertEqual(resp['Retry-After'], '5')
+        self.assertEqual(0, EncodeJob.objects.get(id=self.job_id).state)
+
+    def test_archive_and_replay(self):
+        from django.core.management import call_command
+        from StringIO import StringIO
+        from .models import ArchivedNotification
+
+        # archived before it was parsed
+        ArchivedNotification.objects.create(message='not json')
+
+        with self.settings(ELASTIC_TRANSCODER_ARCHIVE_NOTIFICATIONS=True):
+            for name in ('onprogress.json', 'oncomplete.json'):
+                with open(os.path.join(FIXTURE_DIRS, name)) as f:
+                    resp = self.client.post('/endpoint/', f.read(), content_type="application/json")
+                self.assertEqual(resp.status_code, 200)
+
+        self.assertEqual(3, ArchivedNotification.objects.count())
+
+        # an outage lost the state changes
+        EncodeJob.objects.update(state=EncodeJob.STATE_SUBMITTED)
+
+        out = StringIO()
+        call_command('replay_encoder_notifications', until='2000-01-01', stdout=out)
+        self.assertEqual(EncodeJob.STATE_SUBMITTED, EncodeJob.objects.get(id=self.job_id).state)
+        self.assertIn('Replayed 0 notifications', out.getvalue())
+
+        ArchivedNotification.objects.create(message=json.dumps({'hello': 'world'}))
+
+        out = StringIO()
+        call_command('replay_encoder_notifications', since='2000-01-01', batch_size=1, stdout=out)
+        self.assertEqual(4, EncodeJob.objects.get(id=self.job_id).state)
+        self.assertIn('Replayed 2 notifications, 0 jobs do not exist, skipped 2 invalid notifications', out.getvalue())
+
+    def test_replay_failing_receiver(self):
+        from django.core.management import call_command
+        from StringIO import StringIO
+        from .models import ArchivedNotification
+
+        content_type = ContentType.objects.get_for_model(Item)
+        EncodeJob.objects.create(id='other', content_type=content_type, object_id=2)
+        for job_id in (self.job_id, 'other'):
+            ArchivedNotification.objects.create(message=json.dumps({'state': 'COMPLETED', 'jobId': job_id}))
+
+        def failing(sender, job, **kwargs):
+            if job.pk == self.job_id:
+                raise ValueError('search is down')
+
+        out = StringIO()
+        transcode_oncomplete.connect(failing)
+        try:
+            call_command('replay_encoder_notifications', batch_size=1, stdout=out)
+        finally:
+            transcode_oncomplete.disconnect(failing)
+
+        self.assertIn('Replayed 2 notifications', out.getvalue())
+        self.assertEqual(2, EncodeJob.objects.filter(state=4).count())
+
+    def test_outputs(self):
+        from .models import EncodeOutput
+        from .notifications import apply_notifications
+
+        for name in ('onprogress.json', 'oncomplete.json'):
+            with open(os.path.join(FIXTURE_DIRS, name)) as f:
+                self.client.post('/endpoint/', f.read(), content_type="application/json")
+
+        output = EncodeOutput.objects.get(job=self.job_id)
+        self.assertEqual(('1', 'output.mp3', '1351620000001-300040', 'Complete', 110),
+                         (output.output_id, output.key, output.preset_id, output.status, output.duration))
+
+        content_type = ContentType.objects.get_for_model(Item)
+        EncodeJob.objects.create(id='other', content_type=content_type, object_id=2)
+        apply_notifications([{'state': 'ERROR', 'jobId': 'other', 'messageDetails': 'broken', 'outputs': [
+            {'id': '1', 'key': 'a.mp4', 'status': 'Complete'},
+            {'id': '2', 'key': 'b.mp4', 'status': 'Error', 'statusDetail': 'broken'},
+        ]}])
+        self.assertEqual([('1', 'Complete'), ('2', 'Error')],
+                         list(EncodeOutput.objects.filter(job='other').order_by('output_id').values_list('output_id', 'status')))
+
+    def test_flush_bad_rows(self):
+        from django.core.management import call_command
+        from StringIO import StringIO
+
+        content_type = ContentType.objects.get_for_model(Item)
+        EncodeJob.objects.create(id='other', content_type=content_type, object_id=2)
+
+        # the buffered endpoint leaves out messages that are not job notifications
+        with override_settings(ELASTIC_TRANSCODER_NOTIFICATION_MODE='buffered'):
+            with open(os.path.join(FIXTURE_DIRS, 'onprogress.json')) as f:
+                data = json.loads(f.read())
+            data['Message'] = json.dumps({'hello': 'world'})
+            resp = self.client.post('/endpoint/', json.dumps(data), content_type="application/json")
+        self.assertEqual(resp.status_code, 200)
+        self.assertEqual(0, BufferedNotification.objects.count())
+
+        BufferedNotification.objects.create(message='not json')
+        BufferedNotification.objects.create(message=json.dumps({'state': 'PROGRESSING'}))
+        BufferedNotification.objects.create(message=json.dumps({'state': 'PROGRESSING', 'jobId': self.job_id}))
+        BufferedNotification.objects.create(message=json.dumps({'state': 'PROGRESSING', 'jobId': 'other'}))
+
+        def broken(sender, job, message, **kwargs):
+            raise ValueError('broken receiver')
+
+        transcode_onprogress.connect(broken)
+        try:
+            call_command('flush_encoder_notifications', once=True, stdout=StringIO())
+        finally:
+            transcode_onprogress.disconnect(broken)
+
+        self.assertEqual(0, BufferedNotification.objects.count())
+        self.assertEqual([EncodeJob.STATE_PROGRESSING] * 2,
+                         [job.state for job in EncodeJob.objects.filter(pk__in=[self.job_id, 'other'])])
+
+    def test_apply_notifications(self):
+        from .notifications import apply_notifications
+
+        content_type = ContentType.objects.get_for_model(Item)
+        for i in range(3):
+            EncodeJob.objects.create(id='job-%d' % i, content_type=content_type, object_id=i)
+
+        missing = apply_notifications([
+            {'state': 'PROGRESSING', 'jobId': 'job-0'},
+            {'state': 'PROGRESSING', 'jobId': 'job-1'},
+            {'state': 'COMPLETED', 'jobId': 'job-1'},
+            {'state': 'ERROR', 'jobId': 'job-2', 'messageDetails': 'failed'},
+            {'state': 'COMPLETED', 'jobId': 'later'},
+        ])
+
+        self.assertEqual(set(['later']), missing)
+        states = dict(EncodeJob.objects.values_list('id', 'state'))
+        self.assertEqual(EncodeJob.STATE_PROGRESSING, states['job-0'])
+        self.assertEqual(4, states['job-1'])  # set by the test receiver
+        self.assertEqual(2, states['job-2'])
+
+
+    @override_settings(ELASTIC_TRANSCODER_DEDUPLICATE_NOTIFICATIONS=True)
+    def test_redelivery(self):
+        from .notifications import seen_messages
+        from .signals import transcode_oncomplete
+
+        received = []
+
+        def count(sender, job, message, **kwargs):
+            received.append(job)
+        transcode_oncomplete.connect(count)
+
+        with open(os.path.join(FIXTURE_DIRS, 'oncomplete.json')) as f:
+            data = json.loads(f.read())
+        data['MessageId'] = '165545c9-2a5c-472c-8df2-7ff2be2b3b1b'
+
+        try:
+            for i in range(2):
+                resp = self.client.post('/endpoint/', json.dumps(data), content_type="application/json")
+                self.assertEqual(resp.status_code, 200)
+
+            # a process that has not seen it yet finds it in the database
+            seen_messages.clear()
+            resp = self.client.post('/endpoint/', json.dumps(data), content_type="application/json")
+            self.assertEqual(resp.status_code, 200)
+        finally:
+            transcode_oncomplete.disconnect(count)
+
+        self.assertEqual(1, len(received))
+        self.assertEqual(1, ReceivedNotification.objects.count())
+
+    def test_failed_notification_not_recorded(self):
+        from .notifications import process_once
+
+        def fail():
+            raise EncodeJob.DoesNotExist()
+
+        self.assertRaises(EncodeJob.DoesNotExist, process_once, 'ae5d8b0b-4a1e-4c59-a0a3-000000000001', fail)
+        self.assertEqual(0, ReceivedNotification.objects.count())
+        self.assertTrue(process_once('ae5d8b0b-4a1e-4c59-a0a3-000000000001', lambda: None))
+
+
 class SignalTest(TestCase):
 
     def test_transcode_onprogress(self):
@@ -223,3 +506,1355 @@ class TranscoderTest(TestCase):
         transcoder = Transcoder(pipeline_id, 'ap-southeast-1')
         transcoder.encode(input, outputs)
 """
+
+
+class FakeConnection(object):
+    """
+    Stand-in for a boto connection that records what was asked of it
+    """
+    def __init__(self, service=None, region=None, access_key_id=None, secret_access_key=None):
+        self.service = service
+        self.region = region
+        self.closed = False
+        self.jobs = []
+
+    def close(self):
+        self.closed = True
+
+    def create_job(self, pipeline_id, input_name, outputs=None, playlists=None):
+        job_id = '%013d-%06d' % (len(self.jobs), len(self.jobs))
+        self.jobs.append((pipeline_id, input_name, outputs, playlists))
+        return {'Job': {'Id': job_id, 'PipelineId': pipeline_id, 'Status': 'Submitted'}}
+
+    presets = {
+        '1351620000001-300040': {'Id': '1351620000001-300040', 'Container': 'mp3'},
+        '1351620000001-200010': {'Id': '1351620000001-200010', 'Container': 'ts'},
+    }
+    pipelines = {
+        'pipeline': {'Id': 'pipeline', 'Status': 'Active', 'InputBucket': 'input'},
+    }
+
+    def list_presets(self, page_token=None):
+        self.jobs.append(('list_presets', page_token))
+        return {'Presets': list(self.presets.values())}
+
+    def read_preset(self, id=None):
+        from boto.elastictranscoder.exceptions import ResourceNotFoundException
+        self.jobs.append(('read_preset', id))
+        try:
+            return {'Preset': self.presets[id]}
+        except KeyError:
+            raise ResourceNotFoundException(404, 'Not Found')
+
+    def read_pipeline(self, id=None):
+        from boto.elastictranscoder.exceptions import ResourceNotFoundException
+        self.jobs.append(('read_pipeline', id))
+        try:
+            return {'Pipeline': self.pipelines[id]}
+        except KeyError:
+            raise ResourceNotFoundException(404, 'Not Found')
+
+
+class FakeConnectionMixin(object):
+    """
+    Have the shared connection pool create ``connection_class`` connections
+    during each test
+    """
+    connection_class = FakeConnection
+
+    def setUp(self):
+        from . import connections
+        self.pool = connections.pool
+        self.factory = self.pool.factory
+        self.pool.factory = self.connection_class
+
+    def tearDown(self):
+        self.pool.close()
+        self.pool.factory = self.factory
+
+
+class ConnectionPoolTest(TestCase):
+
+    def setUp(self):
+        from .connections import ConnectionPool
+        self.pool = ConnectionPool(factory=FakeConnection)
+
+    def test_reuse(self):
+        conn = self.pool.get('elastictranscoder', 'us-east-1', 'key', 'secret')
+        self.assertIs(conn, self.pool.get('elastictranscoder', 'us-east-1', 'key', 'secret'))
+        self.assertIsNot(conn, self.pool.get('elastictranscoder', 'eu-west-1', 'key', 'secret'))
+        self.assertIsNot(conn, self.pool.get('elastictranscoder', 'us-east-1', 'other', 'secret'))
+        self.assertEqual(3, len(self.pool))
+
+    def test_idle_eviction(self):
+        self.pool.idle_timeout = 60
+        conn = self.pool.get('sns', 'us-east-1', 'key', 'secret')
+        key = ('sns', 'us-east-1', 'key', 'secret')
+        self.pool.connections[key] = (conn, 0)
+
+        self.assertIsNot(conn, self.pool.get('sns', 'us-east-1', 'key', 'secret'))
+        self.assertTrue(conn.closed)
+
+    def test_close(self):
+        conn = self.pool.get('sns', 'us-east-1', 'key', 'secret')
+        self.pool.close()
+
+        self.assertTrue(conn.closed)
+        self.assertEqual(0, len(self.pool))
+
+
+class SharedPoolTest(TestCase):
+
+    @override_settings(TEST_POOL_WORKERS=2, TEST_POOL_QUEUE=1)
+    def test_defer_and_close(self):
+        import threading
+        from .utils import SharedPool
+
+        pool = SharedPool('TEST_POOL_WORKERS', 4, 'TEST_POOL_QUEUE', 10)
+        release = threading.Event()
+        done = []
+
+        def call(value):
+            release.wait(5)
+            done.append(value)
+
+        self.assertTrue(pool.defer(call, 1))
+        # the queue is full until the call is over
+        self.assertFalse(pool.defer(call, 2))
+        release.set()
+        pool.close()
+
+        self.assertEqual([1], done)
+        self.assertEqual(0, pool.queued)
+        self.assertIsNone(pool.pool)
+
+
+class TranscoderTest(FakeConnectionMixin, TestCase):
+
+    def test_shared_connection(self):
+        from .transcoder import Transcoder
+
+        outputs = [{'Key': 'hello.mp3', 'PresetId': '1351620000001-300040'}]
+
+        first = Transcoder('pipeline', 'us-east-1', 'key', 'secret')
+        first.encode({'Key': 'a.mp3'}, outputs)
+        second = Transcoder('pipeline', 'us-east-1', 'key', 'secret')
+        second.encode({'Key': 'b.mp3'}, outputs)
+
+        self.assertIs(first.get_connection(), second.get_connection())
+        self.assertEqual(2, len(first.get_connection().jobs))
+        self.assertNotEqual(first.message['Job']['Id'], second.message['Job']['Id'])
+
+    def test_create_job_for_object(self):
+        from .transcoder import Transcoder
+
+        item = Item.objects.create(name='Hello')
+        transcoder = Transcoder('pipeline', 'us-east-1', 'key', 'secret')
+        transcoder.encode({'Key': 'a.mp3'}, [{'Key': 'hello.mp3', 'PresetId': '1351620000001-300040'}])
+        job = transcoder.create_job_for_object(item)
+
+        self.assertEqual(transcoder.message['Job']['Id'], job.id)
+        self.assertEqual(item, job.content_object)
+
+    def test_deduplicate(self):
+        from .transcoder import Transcoder
+
+        outputs = [{'Key': 'hello.mp3', 'PresetId': '1351620000001-300040'}]
+        first, second = Item.objects.create(name='first'), Item.objects.create(name='second')
+
+        transcoder = Transcoder('pipeline', 'us-east-1', 'key', 'secret')
+        transcoder.encode({'Key': 'first.mp3'}, outputs, content_hash='d41d8cd98f00b204e9800998ecf8427e')
+        original = transcoder.create_job_for_object(first)
+
+        transcoder.encode({'Key': 'second.mp3'}, outputs, content_hash='d41d8cd98f00b204e9800998ecf8427e')
+        duplicate = transcoder.create_job_for_object(second)
+
+        self.assertEqual(1, len(transcoder.get_connection().jobs))
+        self.assertEqual(original, duplicate.duplicate_of)
+        self.assertEqual(original.fingerprint, duplicate.fingerprint)
+        self.assertEqual(second, duplicate.content_object)
+
+        # failed jobs are not reused
+        original.state = EncodeJob.STATE_ERROR
+        original.save()
+        transcoder.encode({'Key': 'second.mp3'}, outputs, content_hash='d41d8cd98f00b204e9800998ecf8427e')
+        self.assertIsNone(transcoder.duplicate_of)
+        self.assertEqual(2, len(transcoder.get_connection().jobs))
+
+    def test_encode_many(self):
+        from .transcoder import Transcoder
+
+        class FailingConnection(FakeConnection):
+            def create_job(self, pipeline_id, input_name, outputs=None, playlists=None):
+                if input_name['Key'] == 'bad.mp3':
+                    raise ValueError('bad input')
+                return super(FailingConnection, self).create_job(pipeline_id, input_name, outputs, playlists)
+
+        self.pool.factory = FailingConnection
+
+        outputs = [{'Key': 'hello.mp3', 'PresetId': '1351620000001-300040'}]
+        good = [Item.objects.create(name='good %d' % i) for i in range(5)]
+        bad = Item.objects.create(name='bad')
+
+        items = [(item, {'Key': '%d.mp3' % item.id}, outputs) for item in good]
+        items.append((bad, {'Key': 'bad.mp3'}, outputs))
+
+        transcoder = Transcoder('pipeline', 'us-east-1', 'key', 'secret')
+        result = transcoder.encode_many(items, max_workers=3)
+
+        self.assertEqual(6, len(result))
+        self.assertEqual(5, EncodeJob.objects.count())
+        self.assertIsInstance(result[bad], ValueError)
+        for item in good:
+            job = EncodeJob.objects.get(pk=result[item].id)
+            self.assertEqual(item.id, job.object_id)
+
+    def test_async_transcoder(self):
+        from .transcoder import AsyncTranscoder
+
+        outputs = [{'Key': 'hello.mp3', 'PresetId': '1351620000001-300040'}]
+        items = [Item.objects.create(name='Hello %d' % i) for i in range(3)]
+
+        transcoders = []
+        for item in items:
+            transcoder = AsyncTranscoder('pipeline', 'us-east-1', 'key', 'secret')
+            transcoder.encode({'Key': '%d.mp3' % item.id}, outputs)
+            transcoders.append(transcoder)
+
+        for item, transcoder in zip(items, transcoders):
+            job = transcoder.create_job_for_object(item)
+            self.assertEqual(transcoder.wait()['Job']['Id'], job.id)
+            self.assertTrue(transcoder.ready())
+
+        self.assertEqual(3, EncodeJob.objects.count())
+
+    def test_async_deduplicate(self):
+        from .transcoder import AsyncTranscoder
+
+        outputs = [{'Key': 'hello.mp3', 'PresetId': '1351620000001-300040'}]
+        first, second = Item.objects.create(name='first'), Item.objects.create(name='second')
+
+        transcoder = AsyncTranscoder('pipeline', 'us-east-1', 'key', 'secret')
+        transcoder.encode({'Key': 'first.mp3'}, outputs, content_hash='d41d8cd98f00b204e9800998ecf8427e')
+        original = transcoder.create_job_for_object(first)
+
+        transcoder = AsyncTranscoder('pipeline', 'us-east-1', 'key', 'secret')
+        transcoder.encode({'Key': 'second.mp3'}, outputs, content_hash='d41d8cd98f00b204e9800998ecf8427e')
+        self.assertTrue(transcoder.ready())
+        duplicate = transcoder.create_job_for_object(second)
+
+        self.assertEqual(1, len(transcoder.get_connection().jobs))
+        self.assertEqual(original, duplicate.duplicate_of)
+        self.assertEqual(second, duplicate.content_object)
+
+
+class ThrottlingError(Exception):
+    status = 429
+
+
+class RateLimiterTest(TestCase):
+
+    def setUp(self):
+        from .ratelimit import RateLimiter
+
+        self.now = 0
+        self.slept = []
+
+        def sleep(seconds):
+            self.slept.append(seconds)
+            self.now += seconds
+
+        self.limiter = RateLimiter(rate=10, burst=2, clock=lambda: self.now, sleep=sleep)
+
+    def test_burst_then_paced(self):
+        for i in range(4):
+            self.limiter.acquire()
+
+        self.assertEqual(2, len(self.slept))
+        self.assertAlmostEqual(0.1, self.slept[0])
+
+    def test_aimd(self):
+        self.limiter.throttled()
+        self.assertEqual(5, self.limiter.current_rate)
+
+        # a second rejection within the cooldown does not halve again
+        self.limiter.throttled()
+        self.assertEqual(5, self.limiter.current_rate)
+
+        for i in range(100):
+            self.limiter.succeeded()
+        self.assertEqual(10, self.limiter.current_rate)
+
+    def test_retry_throttled(self):
+        calls = []
+
+        def create_job():
+            calls.append(1)
+            if len(calls) < 3:
+                raise ThrottlingError()
+            return 'ok'
+
+        self.assertEqual('ok', self.limiter.call(create_job))
+        self.assertEqual(3, len(calls))
+        self.assertTrue(self.limiter.current_rate < 10)
+
+    def test_give_up(self):
+        self.limiter.max_retries = 2
+
+        def create_job():
+            raise ThrottlingError()
+
+        self.assertRaises(ThrottlingError, self.limiter.call, create_job)
+
+    def test_other_errors_not_retried(self):
+        calls = []
+
+        def create_job():
+            calls.append(1)
+            raise ValueError()
+
+        self.assertRaises(ValueError, self.limiter.call, create_job)
+        self.assertEqual(1, len(calls))
+
+
+@override_settings(AWS_ACCESS_KEY_ID='key', AWS_SECRET_ACCESS_KEY='secret', AWS_REGION='us-east-1')
+class OutboxTest(FakeConnectionMixin, TestCase):
+
+    def test_enqueue(self):
+        from .transcoder import Transcoder
+        from .outbox import claim_requests, process_requests
+
+        outputs = [{'Key': 'hello.mp3', 'PresetId': '1351620000001-300040'}]
+        items = [Item.objects.create(name='Hello %d' % i) for i in range(3)]
+
+        transcoder = Transcoder('pipeline')
+        for item in items:
+            transcoder.enqueue(item, {'Key': '%d.mp3' % item.id}, outputs)
+
+        self.assertEqual(0, EncodeJob.objects.count())
+
+        claimed = claim_requests(batch_size=2)
+        self.assertEqual(2, len(claimed))
+        self.assertEqual(1, len(claim_requests(batch_size=2)))
+        self.assertEqual([], claim_requests())
+
+        self.assertEqual((2, 0), process_requests(claimed))
+        for request in EncodeRequest.objects.filter(pk__in=[r.pk for r in claimed]):
+            self.assertEqual(EncodeRequest.STATE_SUBMITTED, request.state)
+            self.assertEqual(request.object_id, request.job.object_id)
+
+    def test_claimed_again(self):
+        from .transcoder import Transcoder
+        from .outbox import claim_requests, process_requests
+
+        outputs = [{'Key': 'hello.mp3', 'PresetId': '1351620000001-300040'}]
+        item = Item.objects.create(name='Hello')
+        Transcoder('pipeline').enqueue(item, {'Key': 'a.mp3'}, outputs)
+
+        claimed = claim_requests()
+        # a slow batch whose rows another worker took over
+        EncodeRequest.objects.update(claim='other')
+
+        self.assertEqual((0, 0), process_requests(claimed))
+        self.assertEqual(0, EncodeJob.objects.count())
+        request = EncodeRequest.objects.get()
+        self.assertEqual((EncodeRequest.STATE_CLAIMED, 'other', None), (request.state, request.claim, request.job))
+
+    def test_enqueue_region(self):
+        from .transcoder import Transcoder
+        from .outbox import claim_requests, process_requests
+
+        item = Item.objects.create(name='Hello')
+        Transcoder('pipeline', 'eu-west-1').enqueue(item, {'Key': 'a.mp3'}, [{'Key': 'hello.mp3', 'PresetId': '1351620000001-300040'}])
+
+        self.assertEqual((1, 0), process_requests(claim_requests()))
+        self.assertEqual(['eu-west-1'], [connection.region for connection, last_used in self.pool.connections.values()])
+
+        with self.assertRaises(ValueError):
+            Transcoder('pipeline', access_key_id='other').enqueue(item, {'Key': 'a.mp3'}, [])
+
+    def test_run_encode_worker(self):
+        from django.core.management import call_command
+        from StringIO import StringIO
+        from .transcoder import Transcoder
+
+        item = Item.objects.create(name='Hello')
+        Transcoder('pipeline').enqueue(item, {'Key': 'a.mp3'}, [{'Key': 'hello.mp3', 'PresetId': '1351620000001-300040'}])
+
+        call_command('run_encode_worker', once=True, stdout=StringIO())
+
+        job = EncodeJob.objects.get()
+        self.assertEqual(item, job.content_object)
+        self.assertEqual(job, EncodeRequest.objects.get().job)
+
+
+class MetadataTest(FakeConnectionMixin, TestCase):
+
+    def setUp(self):
+        from django.core.cache import cache
+        from .transcoder import Transcoder
+
+        super(MetadataTest, self).setUp()
+        cache.clear()
+        self.transcoder = Transcoder('pipeline', 'us-east-1', 'key', 'secret')
+        self.connection = self.transcoder.get_connection()
+
+    def test_cached(self):
+        from .metadata import get_preset, get_pipeline, invalidate_pipeline
+
+        self.assertEqual('mp3', get_preset(self.transcoder, '1351620000001-300040')['Container'])
+        self.assertEqual('ts', get_preset(self.transcoder, '1351620000001-200010')['Container'])
+        self.assertEqual('input', get_pipeline(self.transcoder)['InputBucket'])
+        self.assertEqual('input', get_pipeline(self.transcoder)['InputBucket'])
+        self.assertEqual(2, len(self.connection.jobs))
+
+        invalidate_pipeline('us-east-1', 'pipeline')
+        get_pipeline(self.transcoder)
+        self.assertEqual(3, len(self.connection.jobs))
+
+    def test_validate(self):
+        from .metadata import validate, InvalidEncodeRequest
+
+        input_name = {'Key': 'input.mp4'}
+        outputs = [{'Key': 'hls/400k', 'PresetId': '1351620000001-200010', 'SegmentDuration': '10'}]
+        playlists = [{'Name': 'index', 'Format': 'HLSv3', 'OutputKeys': ['hls/400k']}]
+
+        validate(self.transcoder, input_name, outputs, playlists)
+
+        bad_preset = [{'Key': 'out.mp3', 'PresetId': 'missing'}]
+        self.assertRaises(InvalidEncodeRequest, validate, self.transcoder, input_name, bad_preset)
+
+        # checked before looking up the preset
+        requests = len(self.connection.jobs)
+        no_preset = [{'Key': 'out.mp3'}]
+        self.assertRaises(InvalidEncodeRequest, validate, self.transcoder, input_name, no_preset)
+        self.assertEqual(requests, len(self.connection.jobs))
+
+        wrong_container = [{'Key': 'hls/400k', 'PresetId': '1351620000001-300040', 'SegmentDuration': '10'}]
+        self.assertRaises(InvalidEncodeRequest, validate, self.transcoder, input_name, wrong_container, playlists)
+
+        unknown_key = [{'Name': 'index', 'Format': 'HLSv3', 'OutputKeys': ['hls/800k']}]
+        self.assertRaises(InvalidEncodeRequest, validate, self.transcoder, input_name, outputs, unknown_key)
+
+        self.transcoder.pipeline_id = 'missing'
+        self.assertRaises(InvalidEncodeRequest, validate, self.transcoder, input_name, outputs, playlists)
+
+    @override_settings(ELASTIC_TRANSCODER_VALIDATE_JOBS=True)
+    def test_encode_validates(self):
+        from .metadata import InvalidEncodeRequest
+
+        self.assertRaises(InvalidEncodeRequest, self.transcoder.encode, {'Key': 'input.mp3'}, [{'Key': 'out.mp3', 'PresetId': 'missing'}])
+        self.transcoder.encode({'Key': 'input.mp3'}, [{'Key': 'out.mp3', 'PresetId': '1351620000001-300040'}])
+        self.assertEqual('Submitted', self.transcoder.message['Job']['Status'])
+
+
+@override_settings(AWS_ACCESS_KEY_ID='key', AWS_SECRET_ACCESS_KEY='secret', AWS_REGION='us-east-1')
+class DispatcherTest(FakeConnectionMixin, TestCase):
+
+    def setUp(self):
+        super(DispatcherTest, self).setUp()
+        self.outputs = [{'Key': 'hello.mp3', 'PresetId': '1351620000001-300040'}]
+
+    def test_least_loaded(self):
+        from .dispatcher import PipelineDispatcher
+
+        content_type = ContentType.objects.get_for_model(Item)
+        for i in range(3):
+            EncodeJob.objects.create(id='busy-%d' % i, content_type=content_type, object_id=1, pipeline_id='busy')
+        EncodeJob.objects.create(id='done', content_type=content_type, object_id=1, pipeline_id='idle',
+                                 state=EncodeJob.STATE_COMPLETE)
+
+        dispatcher = PipelineDispatcher(['busy', 'idle'])
+        chosen = [dispatcher.encode({'Key': '%d.mp3' % i}, self.outputs).pipeline_id for i in range(5)]
+
+        self.assertEqual(['idle', 'idle', 'idle', 'busy', 'idle'], chosen)
+
+    def test_weight_and_priority(self):
+        from .dispatcher import PipelineDispatcher
+
+        dispatcher = PipelineDispatcher([
+            {'id': 'small', 'weight': 1, 'max_active': 2},
+            {'id': 'large', 'weight': 3, 'max_active': 6},
+            {'id': 'spare', 'priority': 1},
+        ])
+        chosen = [dispatcher.choose().id for i in range(10)]
+
+        self.assertEqual(2, chosen.count('small'))
+        self.assertEqual(6, chosen.count('large'))
+        self.assertEqual(['spare', 'spare'], chosen[-2:])
+
+    def test_records_pipeline(self):
+        from .dispatcher import PipelineDispatcher
+
+        item = Item.objects.create(name='Hello')
+        transcoder = PipelineDispatcher(['only']).encode({'Key': 'a.mp3'}, self.outputs)
+        job = transcoder.create_job_for_object(item)
+
+        self.assertEqual('only', EncodeJob.objects.get(pk=job.pk).pipeline_id)
+
+
+class FlakyConnection(FakeConnection):
+    """
+    Fake connection failing every request made to one of ``failing`` regions
+    """
+    failing = set()
+
+    def create_job(self, pipeline_id, input_name, outputs=None, playlists=None):
+        if self.region in self.failing:
+            self.jobs.append(None)
+            raise IOError('timed out')
+        return super(FlakyConnection, self).create_job(pipeline_id, input_name, outputs, playlists)
+
+
+@override_settings(AWS_ACCESS_KEY_ID='key', AWS_SECRET_ACCESS_KEY='secret')
+class FailoverTest(FakeConnectionMixin, TestCase):
+    connection_class = FlakyConnection
+
+    def setUp(self):
+        from .failover import FailoverTranscoder, HealthTracker
+
+        super(FailoverTest, self).setUp()
+        FlakyConnection.failing = set(['us-east-1'])
+
+        self.now = 0
+        self.tracker = HealthTracker(clock=lambda: self.now)
+        self.transcoder = FailoverTranscoder([
+            {'region': 'us-east-1', 'pipeline_id': 'east'},
+            {'region': 'eu-west-1', 'pipeline_id': 'west'},
+        ], tracker=self.tracker)
+        self.outputs = [{'Key': 'hello.mp3', 'PresetId': '1351620000001-300040'}]
+
+    def tearDown(self):
+        from .breaker import reset_breakers
+
+        reset_breakers()
+        super(FailoverTest, self).tearDown()
+
+    def test_failover(self):
+        east = self.pool.get('elastictranscoder', 'us-east-1', 'key', 'secret')
+
+        for i in range(5):
+            transcoder = self.transcoder.encode({'Key': 'a.mp3'}, self.outputs)
+            self.assertEqual('eu-west-1', transcoder.aws_region)
+            self.assertEqual('west', transcoder.pipeline_id)
+
+        # the region is skipped once its error rate is over the threshold
+        self.assertEqual(4, len(east.jobs))
+        self.assertTrue(self.tracker['us-east-1'].is_open())
+
+        # and probed again after the open interval
+        FlakyConnection.failing = set()
+        self.now += 31
+        self.assertEqual('us-east-1', self.transcoder.encode({'Key': 'a.mp3'}, self.outputs).aws_region)
+        self.assertFalse(self.tracker['us-east-1'].is_open())
+
+    def test_probe_taken_when_called(self):
+        west = self.tracker['eu-west-1']
+        for i in range(4):
+            west.record_failure(0.1)
+        self.assertEqual(30, west.open_until)
+
+        # a request served by the preferred region leaves the probe
+        FlakyConnection.failing = set()
+        self.now = 31
+        self.assertEqual('us-east-1', self.transcoder.encode({'Key': 'a.mp3'}, self.outputs).aws_region)
+        self.assertEqual(30, west.open_until)
+
+        FlakyConnection.failing = set(['us-east-1'])
+        self.now = 40
+        self.assertEqual('eu-west-1', self.transcoder.encode({'Key': 'a.mp3'}, self.outputs).aws_region)
+        self.assertIsNone(west.open_until)
+
+    def test_slow_region(self):
+        from .failover import FailoverTranscoder
+
+        FlakyConnection.failing = set()
+        transcoder = FailoverTranscoder(self.transcoder.regions, tracker=self.tracker, max_latency=1)
+        self.tracker['us-east-1'].record_success(5)
+        self.assertEqual('eu-west-1', transcoder.encode({'Key': 'a.mp3'}, self.outputs).aws_region)
+
+    def test_all_regions_failing(self):
+        FlakyConnection.failing = set(['us-east-1', 'eu-west-1'])
+        self.assertRaises(IOError, self.transcoder.encode, {'Key': 'a.mp3'}, self.outputs)
+
+    def test_client_errors_not_retried(self):
+        from boto.elastictranscoder.exceptions import ValidationException
+
+        class InvalidConnection(FakeConnection):
+            def create_job(self, *args, **kwargs):
+                raise ValidationException(400, 'Bad Request')
+
+        self.pool.factory = InvalidConnection
+        self.assertRaises(ValidationException, self.transcoder.encode, {'Key': 'a.mp3'}, self.outputs)
+        self.assertEqual(0, self.tracker['us-east-1'].samples)
+
+
+class CircuitBreakerTest(TestCase):
+
+    def setUp(self):
+        self.now = 0
+        self.calls = []
+
+    def fail(self):
+        self.calls.append('fail')
+        raise IOError('timed out')
+
+    def succeed(self):
+        self.calls.append('ok')
+        return 'ok'
+
+    def check_breaker(self, breaker):
+        from .breaker import CircuitOpenError
+
+        for i in range(3):
+            self.assertRaises(IOError, breaker.call, self.fail)
+        self.assertEqual(breaker.OPEN, breaker.state)
+
+        # fail fast without calling AWS
+        self.assertRaises(CircuitOpenError, breaker.call, self.succeed)
+        self.assertEqual(3, len(self.calls))
+
+        # a failing probe opens the circuit again
+        self.now += 31
+        self.assertEqual(breaker.HALF_OPEN, breaker.state)
+        self.assertRaises(IOError, breaker.call, self.fail)
+        self.assertRaises(CircuitOpenError, breaker.call, self.succeed)
+
+        # a successful probe closes it
+        self.now += 31
+        self.assertEqual('ok', breaker.call(self.succeed))
+        self.assertEqual(breaker.CLOSED, breaker.state)
+
+    def test_breaker(self):
+        from .breaker import CircuitBreaker
+        self.check_breaker(CircuitBreaker('test', failure_threshold=3, clock=lambda: self.now))
+
+    def test_cache_breaker(self):
+        from django.core.cache import cache
+        from .breaker import CacheCircuitBreaker
+
+        cache.clear()
+        self.check_breaker(CacheCircuitBreaker('test', cache, failure_threshold=3, clock=lambda: self.now))
+
+        # state is shared through the cache
+        first = CacheCircuitBreaker('shared', cache, failure_threshold=1, clock=lambda: self.now)
+        second = CacheCircuitBreaker('shared', cache, failure_threshold=1, clock=lambda: self.now)
+        self.assertRaises(IOError, first.call, self.fail)
+        self.assertEqual(second.OPEN, second.state)
+
+    def test_client_errors_ignored(self):
+        from .breaker import CircuitBreaker
+        from .metadata import InvalidEncodeRequest
+
+        breaker = CircuitBreaker('test', failure_threshold=1, clock=lambda: self.now)
+
+        def invalid():
+            raise InvalidEncodeRequest()
+
+        def throttled():
+            raise ThrottlingError()
+
+        self.assertRaises(InvalidEncodeRequest, breaker.call, invalid)
+        self.assertRaises(ThrottlingError, breaker.call, throttled)
+        self.assertEqual(breaker.CLOSED, breaker.state)
+
+
+fetched_urls = []
+
+
+def fetch_subscribe_url(url):
+    if 'fail' in url:
+        raise IOError('connection refused')
+    fetched_urls.append(url)
+
+
+@override_settings(
+    ADMINS=(('Admin', 'admin@example.com'),),
+    ELASTIC_TRANSCODER_CONFIRM_IN_BACKGROUND=False,
+    ELASTIC_TRANSCODER_CONFIRMATION_FETCHER='dj_elastictranscoder.tests.fetch_subscribe_url')
+class ConfirmationTest(TestCase):
+    urls = 'dj_elastictranscoder.urls'
+
+    def setUp(self):
+        del fetched_urls[:]
+
+    def post_confirmation(self, subscribe_url):
+        data = {
+            'Type': 'SubscriptionConfirmation',
+            'TopicArn': 'arn:aws:sns:us-east-1:123456789012:topic',
+            'SubscribeURL': subscribe_url,
+        }
+        return self.client.post('/endpoint/', json.dumps(data), content_type="application/json")
+
+    def test_confirm(self):
+        from django.core import mail
+        from django.core.management import call_command
+        from StringIO import StringIO
+
+        resp = self.post_confirmation('https://sns.us-east-1.amazonaws.com/?Action=ConfirmSubscription')
+        self.assertEqual(resp.status_code, 200)
+        self.assertEqual([], fetched_urls)
+
+        call_command('confirm_encoder_subscriptions', once=True, stdout=StringIO())
+
+        self.assertEqual(['https://sns.us-east-1.amazonaws.com/?Action=ConfirmSubscription'], fetched_urls)
+        self.assertIsNotNone(PendingConfirmation.objects.get().confirmed_at)
+        self.assertEqual(1, len(mail.outbox))
+
+    def test_backoff(self):
+        from .confirmations import confirm_pending
+
+        self.post_confirmation('https://sns.us-east-1.amazonaws.com/?fail')
+        self.assertEqual((0, 1), confirm_pending())
+
+        confirmation = PendingConfirmation.objects.get()
+        self.assertEqual(1, confirmation.attempts)
+        self.assertIsNone(confirmation.confirmed_at)
+        self.assertIn('connection refused', confirmation.error)
+
+        # not due again yet
+        self.assertEqual((0, 0), confirm_pending())
+
+    def test_default_fetcher(self):
+        import threading
+        from BaseHTTPServer import BaseHTTPRequestHandler, HTTPServer
+        from .confirmations import fetch
+
+        paths = []
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                paths.append(self.path)
+                self.send_response(200)
+                self.end_headers()
+                self.wfile.write('<ConfirmSubscriptionResponse/>')
+
+            def log_message(self, *args):
+                pass
+
+        server = HTTPServer(('127.0.0.1', 0), Handler)
+        thread = threading.Thread(target=server.handle_request)
+        thread.start()
+
+        fetch('http://127.0.0.1:%d/?Action=ConfirmSubscription' % server.server_port)
+        thread.join()
+        server.server_close()
+
+        self.assertEqual(['/?Action=ConfirmSubscription'], paths)
+
+
+try:
+    import cryptography
+except ImportError:
+    cryptography = None
+
+
+@unittest.skipIf(cryptography is None, 'cryptography is not installed')
+@override_settings(ELASTIC_TRANSCODER_VERIFY_SIGNATURES=True,
+                   ELASTIC_TRANSCODER_TOPIC_ARN='arn:aws:sns:us-east-1:123456789012:encoder')
+class SignatureTest(TestCase):
+    urls = 'dj_elastictranscoder.urls'
+    cert_url = 'https://sns.us-east-1.amazonaws.com/SimpleNotificationService-test.pem'
+
+    def setUp(self):
+        import datetime
+        import hashlib
+        from django.core.cache import cache
+        from cryptography import x509
+        from cryptography.x509.oid import NameOID
+        from cryptography.hazmat.backends import default_backend
+        from cryptography.hazmat.primitives import hashes, serialization
+        from cryptography.hazmat.primitives.asymmetric import rsa
+        from .signatures import public_keys
+
+        key = rsa.generate_private_key(public_exponent=65537, key_size=2048, backend=default_backend())
+        name = x509.Name([x509.NameAttribute(NameOID.COMMON_NAME, u'sns.amazonaws.com')])
+        now = datetime.datetime.utcnow()
+        cert = (x509.CertificateBuilder()
+            .subject_name(name)
+            .issuer_name(name)
+            .public_key(key.public_key())
+            .serial_number(1)
+            .not_valid_before(now)
+            .not_valid_after(now + datetime.timedelta(days=1))
+            .sign(key, hashes.SHA256(), default_backend()))
+
+        public_keys.clear()
+        cache.clear()
+        cache.set('dj_elastictranscoder:cert:%s' % hashlib.sha1(self.cert_url).hexdigest(),
+                  cert.public_bytes(serialization.Encoding.PEM))
+
+        content_type = ContentType.objects.get_for_model(Item)
+        EncodeJob.objects.create(id='1396802241671-jkmme8', content_type=content_type, object_id=1)
+
+        with open(os.path.join(FIXTURE_DIRS, 'onprogress.json')) as f:
+            data = json.loads(f.read())
+        self.key = key
+        self.data = self.sign(dict(data, TopicArn='arn:aws:sns:us-east-1:123456789012:encoder'))
+
+    def sign(self, data):
+        import base64
+        from cryptography.hazmat.primitives import hashes
+        from cryptography.hazmat.primitives.asymmetric import padding
+        from .signatures import get_string_to_sign
+
+        data = dict(data, SigningCertURL=self.cert_url)
+        signature = self.key.sign(get_string_to_sign(data), padding.PKCS1v15(), hashes.SHA1())
+        data['Signature'] = base64.b64encode(signature)
+        return data
+
+    def post(self, data):
+        return self.client.post('/endpoint/', json.dumps(data), content_type="application/json")
+
+    def test_valid(self):
+        from .signatures import public_keys
+
+        resp = self.post(self.data)
+        self.assertEqual(resp.status_code, 200)
+        self.assertIn(self.cert_url, public_keys)
+        self.assertEqual(1, EncodeJob.objects.get().state)
+
+    def test_forged(self):
+        self.data['Message'] = self.data['Message'].replace('PROGRESSING', 'COMPLETED')
+        resp = self.post(self.data)
+        self.assertEqual(resp.status_code, 403)
+        self.assertEqual(0, EncodeJob.objects.get().state)
+
+    def test_other_topic(self):
+        from .models import PendingConfirmation
+
+        other = 'arn:aws:sns:us-east-1:210987654321:attacker'
+        resp = self.post(self.sign(dict(self.data, TopicArn=other)))
+        self.assertEqual(resp.status_code, 403)
+        self.assertEqual(0, EncodeJob.objects.get().state)
+
+        resp = self.post(self.sign({
+            'Type': 'SubscriptionConfirmation', 'MessageId': '1', 'Token': 'token', 'TopicArn': other,
+            'Message': 'You have chosen to subscribe', 'Timestamp': '2014-04-06T16:37:21.690Z',
+            'SubscribeURL': 'https://sns.us-east-1.amazonaws.com/?Action=ConfirmSubscription',
+            'SignatureVersion': '1'}))
+        self.assertEqual(resp.status_code, 403)
+        self.assertEqual(0, PendingConfirmation.objects.count())
+
+    def test_untrusted_certificate(self):
+        self.data['SigningCertURL'] = 'https://example.com/SimpleNotificationService-test.pem'
+        resp = self.post(self.data)
+        self.assertEqual(resp.status_code, 403)
+
+
+@override_settings(ELASTIC_TRANSCODER_SIGNAL_DISPATCH='pool')
+class ReceiverDispatchTest(TestCase):
+
+    def setUp(self):
+        content_type = ContentType.objects.get_for_model(Item)
+        self.job = EncodeJob.objects.create(id='1396802241671-jkmme8', content_type=content_type, object_id=1)
+
+        with open(os.path.join(FIXTURE_DIRS, 'oncomplete.json')) as f:
+            self.message = json.loads(json.loads(f.read())['Message'])
+
+    def test_background_and_isolated(self):
+        import threading
+        from .notifications import apply_notification
+        from .receivers import background, executor
+        from .signals import transcode_oncomplete
+
+        done = threading.Event()
+        threads = []
+
+        @background
+        def slow(sender, job, message, **kwargs):
+            threads.append(threading.current_thread())
+            done.set()
+
+        def broken(sender, job, message, **kwargs):
+            raise ValueError('broken receiver')
+
+        transcode_oncomplete.connect(slow)
+        transcode_oncomplete.connect(broken)
+        try:
+            self.assertEqual(1, apply_notification(self.message))
+            self.assertTrue(done.wait(5))
+        finally:
+            transcode_oncomplete.disconnect(slow)
+            transcode_oncomplete.disconnect(broken)
+            executor.close()
+
+        self.assertIsNot(threading.current_thread(), threads[0])
+        # the synchronous test receiver still ran
+        self.assertEqual(4, EncodeJob.objects.get().state)
+
+    @override_settings(ELASTIC_TRANSCODER_SIGNAL_QUEUE=0)
+    def test_background_queue_full(self):
+        import threading
+        from .notifications import apply_notification
+        from .receivers import background
+        from .signals import transcode_oncomplete
+
+        threads = []
+
+        @background
+        def slow(sender, job, message, **kwargs):
+            threads.append(threading.current_thread())
+
+        transcode_oncomplete.connect(slow)
+        try:
+            self.assertEqual(1, apply_notification(self.message))
+        finally:
+            transcode_oncomplete.disconnect(slow)
+
+        self.assertEqual([threading.current_thread()], threads)
+
+    def test_batch_complete(self):
+        from . import notifications
+        from .receivers import BatchCollector
+        from .signals import transcode_batch_complete
+
+        content_type = ContentType.objects.get_for_model(Item)
+        EncodeJob.objects.create(id='second', content_type=content_type, object_id=2)
+        second = dict(self.message, jobId='second')
+
+        batches = []
+
+        def reindex(sender, jobs, **kwargs):
+            batches.append(jobs)
+
+        collector = BatchCollector(size=2, window=60)
+        default, notifications.collector = notifications.collector, collector
+        transcode_batch_complete.connect(reindex)
+        try:
+            notifications.apply_notifications([self.message, second])
+        finally:
+            transcode_batch_complete.disconnect(reindex)
+            notifications.collector = default
+
+        self.assertEqual(1, len(batches))
+        self.assertEqual(set(['1396802241671-jkmme8', 'second']), set(job.pk for job, message in batches[0]))
+        self.assertIsNone(collector.timer)
+
+    def test_batch_complete_window(self):
+        from .receivers import BatchCollector
+        from .signals import transcode_batch_complete
+
+        batches = []
+
+        def reindex(sender, jobs, **kwargs):
+            batches.append(jobs)
+
+        collector = BatchCollector(size=10, window=0.01)
+        transcode_batch_complete.connect(reindex)
+        try:
+            collector.add(self.job, self.message)
+            self.assertEqual([], batches)
+            collector.timer.join(5)
+        finally:
+            transcode_batch_complete.disconnect(reindex)
+
+        self.assertEqual([[(self.job, self.message)]], batches)
+
+    def test_batch_complete_failing_receiver(self):
+        from . import receivers
+        from .receivers import BatchCollector
+        from .signals import transcode_batch_complete
+
+        batches = []
+
+        def failing(sender, jobs, **kwargs):
+            raise ValueError('search is down')
+
+        def reindex(sender, jobs, **kwargs):
+            batches.append(jobs)
+
+        class Logger(object):
+            logged = []
+
+            def exception(self, msg, *args):
+                self.logged.append(msg % args)
+
+        collector = BatchCollector(size=1, window=60)
+        default, receivers.logger = receivers.logger, Logger()
+        transcode_batch_complete.connect(failing)
+        transcode_batch_complete.connect(reindex)
+        try:
+            collector.add(self.job, self.message)
+        finally:
+            transcode_batch_complete.disconnect(failing)
+            transcode_batch_complete.disconnect(reindex)
+            receivers.logger = default
+
+        self.assertEqual([[(self.job, self.message)]], batches)
+        self.assertEqual(1, len(Logger.logged))
+
+
+class AdmissionControllerTest(TestCase):
+
+    def setUp(self):
+        self.now = 0
+        self.clock = lambda: self.now
+
+    def test_max_inflight(self):
+        from .admission import AdmissionController
+
+        controller = AdmissionController(max_inflight=2, clock=self.clock)
+        self.assertTrue(controller.acquire())
+        self.assertTrue(controller.acquire())
+        self.assertFalse(controller.acquire())
+
+        controller.release(0.01)
+        self.assertTrue(controller.acquire())
+        self.assertEqual({'admitted': 3, 'shed': 1, 'inflight': 2, 'latency': 0.01}, controller.stats())
+
+    def test_max_latency(self):
+        from .admission import AdmissionController
+
+        controller = AdmissionController(max_latency=0.5, retry_after=5, alpha=0.5, clock=self.clock)
+        self.assertTrue(controller.acquire())
+        controller.release(0.2)
+        self.assertTrue(controller.acquire())
+        controller.release(1.0)
+
+        # average of 0.6s, refused for retry_after seconds
+        self.assertFalse(controller.acquire())
+        self.now = 5
+        self.assertTrue(controller.acquire())
+        controller.release(0.1)
+        self.assertTrue(controller.acquire())
+        self.assertEqual(1, controller.stats()['shed'])
+
+
+class FakeSQSMessage(object):
+    def __init__(self, body):
+        self.body = body
+
+    def get_body(self):
+        return self.body
+
+
+class FakeQueue(object):
+    """
+    Stand-in for a boto SQS queue
+    """
+    def __init__(self, bodies=()):
+        self.messages = [FakeSQSMessage(body) for body in bodies]
+        self.deleted = []
+
+    def set_message_class(self, message_class):
+        pass
+
+    def get_messages(self, num_messages=1, visibility_timeout=None, attributes=None, wait_time_seconds=None):
+        received, self.messages = self.messages[:num_messages], self.messages[num_messages:]
+        return received
+
+    def delete_message_batch(self, messages):
+        self.deleted.extend(messages)
+
+
+class ConsumerTest(FakeConnectionMixin, TestCase):
+
+    def setUp(self):
+        super(ConsumerTest, self).setUp()
+        content_type = ContentType.objects.get_for_model(Item)
+        self.job = EncodeJob.objects.create(id='1396802241671-jkmme8', content_type=content_type, object_id=1)
+
+        with open(os.path.join(FIXTURE_DIRS, 'oncomplete.json')) as f:
+            self.envelope = f.read()
+
+    def test_consume_once(self):
+        from .consumer import consume_once
+
+        # raw message delivery, for a job that does not exist yet
+        missing = json.dumps({'state': 'PROGRESSING', 'jobId': 'missing'})
+        confirmation = json.dumps({'Type': 'SubscriptionConfirmation', 'Message': 'You have chosen to subscribe'})
+        no_state = json.dumps({'Type': 'Notification', 'Message': json.dumps({'jobId': 'x'})})
+        queue = FakeQueue([self.envelope, missing, 'not json', confirmation, no_state])
+
+        self.assertEqual(5, consume_once(queue, wait_time=0))
+        self.assertEqual(4, EncodeJob.objects.get().state)
+        self.assertEqual(sorted(['not json', confirmation, no_state, self.envelope]),
+                         sorted(m.body for m in queue.deleted))
+        self.assertEqual(0, consume_once(queue, wait_time=0))
+
+    def test_failing_receiver(self):
+        from .consumer import consume_once
+
+        content_type = ContentType.objects.get_for_model(Item)
+        for i in range(3):
+            EncodeJob.objects.create(id='job%d' % i, content_type=content_type, object_id=i)
+
+        notified = []
+
+        def reindex(sender, job, **kwargs):
+            if job.pk == 'job2':
+                raise ValueError('search is down')
+            notified.append(job.pk)
+
+        queue = FakeQueue([json.dumps({'state': 'COMPLETED', 'jobId': 'job%d' % i}) for i in range(3)])
+        transcode_oncomplete.connect(reindex)
+        try:
+            consume_once(queue, wait_time=0)
+            consume_once(queue, wait_time=0)
+        finally:
+            transcode_oncomplete.disconnect(reindex)
+
+        # the batch is kept and deleted, the other receivers run once
+        self.assertEqual(['job0', 'job1'], sorted(notified))
+        self.assertEqual(3, len(queue.deleted))
+        # the test receivers set COMPLETE to 4
+        self.assertEqual(3, EncodeJob.objects.filter(pk__startswith='job', state=4).count())
+
+    def test_command(self):
+        from django.core.management import call_command
+        from StringIO import StringIO
+
+        queue = FakeQueue([self.envelope] * 12)
+
+        class FakeSQSConnection(FakeConnection):
+            def get_queue(self, name):
+                return queue if name == 'encoder' else None
+
+        self.pool.factory = FakeSQSConnection
+        out = StringIO()
+        call_command('consume_encoder_queue', queue='encoder', once=True, stdout=out)
+
+        self.assertIn('Received 12 notifications', out.getvalue())
+        self.assertEqual(12, len(queue.deleted))
+
+
+@override_settings(AWS_ACCESS_KEY_ID='key', AWS_SECRET_ACCESS_KEY='secret', AWS_REGION='us-east-1')
+class ReconcileTest(FakeConnectionMixin, TestCase):
+
+    def setUp(self):
+        from datetime import timedelta
+        from django.utils import timezone
+
+        super(ReconcileTest, self).setUp()
+        content_type = ContentType.objects.get_for_model(Item)
+        for pk, state in [('a', 0), ('b', 1), ('c', 0), ('d', 0)]:
+            EncodeJob.objects.create(id=pk, content_type=content_type, object_id=1, state=state, pipeline_id='pipeline')
+        EncodeJob.objects.exclude(pk='c').update(last_modified=timezone.now() - timedelta(hours=2))
+
+    def test_reconcile(self):
+        from django.core.management import call_command
+        from StringIO import StringIO
+
+        pages = {
+            None: {'Jobs': [
+                {'Id': 'a', 'Status': 'Complete', 'Outputs': [{'Id': '1', 'Status': 'Complete'}]},
+                {'Id': 'c', 'Status': 'Complete'},
+                {'Id': 'unknown', 'Status': 'Complete'},
+            ], 'NextPageToken': 'next'},
+            'next': {'Jobs': [
+                {'Id': 'b', 'Status': 'Error', 'Outputs': [{'Id': '1', 'Status': 'Error', 'StatusDetail': '3002 broken'}]},
+                {'Id': 'd', 'Status': 'Progressing', 'Timing': {'SubmitTimeMillis': 0}},
+            ], 'NextPageToken': 'older'},
+        }
+        calls = []
+
+        class FakeListConnection(FakeConnection):
+            def list_jobs_by_pipeline(self, pipeline_id=None, ascending=None, page_token=None):
+                calls.append((pipeline_id, page_token))
+                return pages[page_token]
+
+        self.pool.factory = FakeListConnection
+        out = StringIO()
+        call_command('reconcile_encode_jobs', stale_after=3600, stdout=out)
+
+        # the second page reaches jobs older than the stale ones
+        self.assertEqual([('pipeline', None), ('pipeline', 'next')], calls)
+        self.assertIn('Checked 5 jobs, corrected 3', out.getvalue())
+
+        states = dict(EncodeJob.objects.values_list('pk', 'state'))
+        # the test receivers set COMPLETE to 4
+        self.assertEqual({'a': 4, 'b': 2, 'c': 0, 'd': 1}, states)
+        self.assertEqual('3002 broken', EncodeJob.objects.get(pk='b').message)
+
+    def test_failing_receiver(self):
+        from .reconcile import reconcile_pipeline, stale_jobs
+
+        class FakeListConnection(FakeConnection):
+            def list_jobs_by_pipeline(self, pipeline_id=None, ascending=None, page_token=None):
+                return {'Jobs': [{'Id': 'a', 'Status': 'Complete'}, {'Id': 'b', 'Status': 'Complete'}]}
+
+        def failing(sender, job, **kwargs):
+            if job.pk == 'a':
+                raise ValueError('search is down')
+
+        transcode_oncomplete.connect(failing)
+        try:
+            self.assertEqual((2, 2), reconcile_pipeline('pipeline', stale_jobs(3600), FakeListConnection()))
+        finally:
+            transcode_oncomplete.disconnect(failing)
+
+        self.assertEqual(2, EncodeJob.objects.filter(pk__in=['a', 'b'], state=4).count())
+
+    def test_unassigned_and_failing_pipeline(self):
+        from datetime import timedelta
+        from django.utils import timezone
+        from .reconcile import reconcile
+
+        content_type = ContentType.objects.get_for_model(Item)
+        for pk, pipeline_id in [('e', ''), ('f', ''), ('g', 'other')]:
+            EncodeJob.objects.create(id=pk, content_type=content_type, object_id=1, pipeline_id=pipeline_id)
+        EncodeJob.objects.filter(pk__in=['e', 'f', 'g']).update(last_modified=timezone.now() - timedelta(hours=2))
+
+        calls = []
+
+        class FakeListConnection(FakeConnection):
+            def list_pipelines(self, page_token=None):
+                if page_token is None:
+                    return {'Pipelines': [{'Id': 'pipeline'}], 'NextPageToken': 'next'}
+                return {'Pipelines': [{'Id': 'other'}]}
+
+            def list_jobs_by_pipeline(self, pipeline_id=None, ascending=None, page_token=None):
+                calls.append(pipeline_id)
+                if pipeline_id == 'pipeline':
+                    raise ValueError('throttled for good')
+                return {'Jobs': [{'Id': 'g', 'Status': 'Error'}, {'Id': 'e', 'Status': 'Complete'}]}
+
+        self.pool.factory = FakeListConnection
+        self.assertEqual((4, 2), reconcile(3600))
+
+        # jobs without a pipeline are found in the job lists of the region
+        self.assertEqual(['other', 'pipeline'], sorted(calls[:2]))
+        self.assertEqual(['pipeline', 'other'], calls[2:])
+        states = dict(EncodeJob.objects.values_list('pk', 'state'))
+        self.assertEqual({'a': 0, 'b': 1, 'c': 0, 'd': 0, 'e': 4, 'f': 0, 'g': 2}, states)
+        self.assertEqual({'e': 'other', 'f': ''},
+                         dict(EncodeJob.objects.filter(pk__in=['e', 'f']).values_list('pk', 'pipeline_id')))
+
+
+class EncodeJobQuerySetTest(TestCase):
+
+    def test_latest_for_objects(self):
+        items = [Item.objects.create(name='item %d' % i) for i in range(3)]
+        content_type = ContentType.objects.get_for_model(Item)
+
+        EncodeJob.objects.create(id='a-1', content_type=content_type, object_id=items[0].pk)
+        EncodeJob.objects.create(id='a-2', content_type=content_type, object_id=items[0].pk, state=EncodeJob.STATE_COMPLETE)
+        EncodeJob.objects.create(id='b-1', content_type=content_type, object_id=items[1].pk)
+
+        with self.assertNumQueries(1):
+            jobs = EncodeJob.objects.latest_for_objects(items)
+        self.assertEqual({items[0]: 'a-2', items[1]: 'b-1'}, dict((obj, job.pk) for obj, job in jobs.items()))
+
+        # the items and their jobs
+        with self.assertNumQueries(2):
+            items = EncodeJob.objects.prefetch_latest(Item.objects.order_by('pk'), to_attr='job')
+        self.assertEqual(['a-2', 'b-1', None], [item.job and item.job.pk for item in items])
+
+        self.assertEqual([], list(EncodeJob.objects.for_objects([])))
+
+
+@override_settings(AWS_ACCESS_KEY_ID='key', AWS_SECRET_ACCESS_KEY='secret', AWS_REGION='us-east-1',
+                   ELASTIC_TRANSCODER_STATUS_CACHE=True)
+class StatusTest(TestCase):
+
+    def setUp(self):
+        from .metadata import get_cache
+        get_cache().clear()
+
+    def test_write_through(self):
+        from .metadata import get_cache
+        from .notifications import apply_notification
+        from .status import get_status
+        from .transcoder import Transcoder
+
+        item = Item.objects.create(name='video')
+        transcoder = Transcoder('pipeline')
+        transcoder.message = {'Job': {'Id': 'job-1'}}
+        transcoder.create_job_for_object(item)
+
+        with self.assertNumQueries(0):
+            self.assertEqual(EncodeJob.STATE_SUBMITTED, get_status(item))
+
+        # a notification invalidates the cached state for a little while,
+        # it is read from the table meanwhile
+        apply_notification({'state': 'PROGRESSING', 'jobId': 'job-1'})
+        for i in range(2):
+            with self.assertNumQueries(1):
+                self.assertEqual(EncodeJob.STATE_PROGRESSING, get_status(item))
+
+        # falls back to the table, then caches again
+        get_cache().clear()
+        with self.assertNumQueries(1):
+            self.assertEqual(EncodeJob.STATE_PROGRESSING, get_status(item))
+        with self.assertNumQueries(0):
+            self.assertEqual(EncodeJob.STATE_PROGRESSING, get_status(item))
+
+        # a new job becomes the status of the object
+        transcoder.message = {'Job': {'Id': 'job-2'}}
+        transcoder.create_job_for_object(item)
+        apply_notification({'state': 'COMPLETED', 'jobId': 'job-1'})
+        self.assertEqual(EncodeJob.STATE_SUBMITTED, get_status(item))
+
+    def test_get_many(self):
+        from .models import EncodeStatus
+        from .status import get_many
+        from .transcoder import Transcoder
+
+        items = [Item.objects.create(name='item %d' % i) for i in range(3)]
+        content_type = ContentType.objects.get_for_model(Item)
+        # saved before the status cache was enabled
+        EncodeJob.objects.create(id='a', content_type=content_type, object_id=items[0].pk, state=EncodeJob.STATE_COMPLETE)
+
+        self.assertEqual({items[0]: EncodeJob.STATE_COMPLETE}, get_many(items))
+        self.assertEqual(1, EncodeStatus.objects.count())
+        with self.assertNumQueries(0):
+            # items without jobs are cached as such
+            self.assertEqual({items[0]: EncodeJob.STATE_COMPLETE}, get_many(items))
+
+        # until they get one
+        transcoder = Transcoder('pipeline')
+        transcoder.message = {'Job': {'Id': 'b'}}
+        transcoder.create_job_for_object(items[1])
+        with self.assertNumQueries(0):
+            self.assertEqual({items[0]: EncodeJob.STATE_COMPLETE, items[1]: EncodeJob.STATE_SUBMITTED},
+                             get_many(items))
+
+    def test_stale_read_not_cached(self):
+        from .metadata import get_cache
+        from .status import get_status, object_key, status_key, update_status
+        from .transcoder import Transcoder
+
+        item = Item.objects.create(name='video')
+        transcoder = Transcoder('pipeline')
+        transcoder.message = {'Job': {'Id': 'job-1'}}
+        transcoder.create_job_for_object(item)
+
+        # a reader that read SUBMITTED from the table before the update
+        update_status(['job-1'], EncodeJob.STATE_COMPLETE)
+        self.assertFalse(get_cache().add(status_key(*object_key(item)), EncodeJob.STATE_SUBMITTED, 60))
+        self.assertEqual(EncodeJob.STATE_COMPLETE, get_status(item))
+
+    def test_set_status_batched(self):
+        from .status import get_many, set_status
+
+        items = [Item.objects.create(name='item %d' % i) for i in range(5)]
+        content_type = ContentType.objects.get_for_model(Item)
+        jobs = [EncodeJob.objects.create(id='job-%d' % i, content_type=content_type, object_id=item.pk)
+                for i, item in enumerate(items)]
+        set_status(jobs[:2])
+
+        # the DELETE and the INSERT, in a savepoint
+        with self.assertNumQueries(4):
+            set_status(jobs)
+        with self.assertNumQueries(0):
+            self.assertEqual(dict((item, EncodeJob.STATE_SUBMITTED) for item in items), get_many(items))
+
+    def test_update_superseded_job(self):
+        from .status import get_status, update_status
+        from .transcoder import Transcoder
+
+        item = Item.objects.create(name='video')
+        transcoder = Transcoder('pipeline')
+        transcoder.message = {'Job': {'Id': 'job-1'}}
+        transcoder.create_job_for_object(item)
+        transcoder.message = {'Job': {'Id': 'job-2'}}
+        transcoder.create_job_for_object(item)
+
+        # the old job no longer matches, the status of the new one stays
+        update_status(['job-1'], EncodeJob.STATE_ERROR)
+        with self.assertNumQueries(0):
+            self.assertEqual(EncodeJob.STATE_SUBMITTED, get_status(item))
+
+        update_status(['job-2'], EncodeJob.STATE_COMPLETE)
+        self.assertEqual(EncodeJob.STATE_COMPLETE, get_status(item))
@@ -1,12 +1,61 @@
-from boto import elastictranscoder
+import hashlib
+import json
+from multiprocessing.pool import ThreadPool
+from uuid import uuid4
 
 from django.conf import settings
 from django.contrib.contenttypes.models import ContentType
 
-from .models import EncodeJob
+from .breaker import get_breaker
+from .connections import get_connection
+from .metadata import get_pipeline, validate
+from .models import EncodeJob, EncodeRequest
+from .ratelimit import get_limiter
+from .status import set_status
+from .utils import SharedPool
+
+
+class EncodeResult(object):
+    """
+    Outcome of ``Transcoder.encode_many``, mapping each source object to
+    either its ``EncodeJob`` or the exception raised while submitting it
+    """
+    def __init__(self):
+        self.jobs = {}
+        self.errors = {}
+
+    def __getitem__(self, obj):
+        try:
+            return self.jobs[obj]
+        except KeyError:
+            return self.errors[obj]
+
+    def __len__(self):
+        return len(self.jobs) + len(self.errors)
+
+
+def fingerprint(pipeline_id, content_hash, outputs, playlists=None):
+    """
+    Identify a job by the content of its input and its normalized outputs
+    and playlists, so identical requests get the same fingerprint
+    """
+    def normalize(specs):
+        specs = [dict((k, v) for k, v in spec.items() if v is not None) for spec in specs or []]
+        return sorted(specs, key=lambda spec: json.dumps(spec, sort_keys=True))
+
+    spec = {
+        'pipeline': pipeline_id,
+        'input': content_hash,
+        'outputs': normalize(outputs),
+        'playlists': normalize(playlists),
+    }
+    return hashlib.sha256(json.dumps(spec, sort_keys=True)).hexdigest()
 
 
 class Transcoder(object):
+    fingerprint = ''
+    duplicate_of = None
+
     def __init__(self, pipeline_id, region=None, access_key_id=None, secret_access_key=None):
         self.pipeline_id = pipeline_id
 
@@ -33,22 +82,241 @@ class Transcoder(object):
             assert False, 'Please provide AWS_REGION'
 
 
-    def encode(self, input_name, outputs, playlists=None):
-        encoder = elastictranscoder.connect_to_region(
-            self.aws_region, 
-            aws_access_key_id=self.aws_access_key_id,
-            aws_secret_access_key=self.aws_secret_access_key)
+    def get_connection(self):
+        return get_connection(
+            'elastictranscoder',
+            self.aws_region,
+            self.aws_access_key_id,
+            self.aws_secret_access_key)
 
-        self.message = encoder.create_job(self.pipeline_id, input_name, outputs=outputs, playlists=playlists)
 
+    def submit(self, input_name, outputs, playlists=None):
+        if getattr(settings, 'ELASTIC_TRANSCODER_VALIDATE_JOBS', False):
+            validate(self, input_name, outputs, playlists)
 
-    def create_job_for_object(self, obj):
-        content_type = ContentType.objects.get_for_model(obj)
+        encoder = self.get_connection()
+
+        breaker = get_breaker('elastictranscoder:%s' % self.aws_region)
+        return breaker.call(
+            get_limiter().call,
+            encoder.create_job, self.pipeline_id, input_name, outputs=outputs, playlists=playlists)
+
+
+    def get_content_hash(self, input_name):
+        """
+        ETag of the input object in the pipeline's input bucket
+        """
+        bucket = get_pipeline(self)['InputBucket']
+        connection = get_connection('s3', None, self.aws_access_key_id, self.aws_secret_access_key)
+        key = connection.get_bucket(bucket, validate=False).get_key(input_name['Key'])
+        if key is None:
+            return None
+        return key.etag.strip('"')
+
+
+    def find_duplicate(self, fingerprint):
+        return (EncodeJob.objects
+            .filter(fingerprint=fingerprint, duplicate_of__isnull=True)
+            .exclude(state=EncodeJob.STATE_ERROR)
+            .order_by('-created_at')
+            .first())
+
+
+    def encode(self, input_name, outputs, playlists=None, content_hash=None):
+        """
+        Submit a job.  When a ``content_hash`` of the input is given (or
+        ELASTIC_TRANSCODER_DEDUPLICATE is enabled, which uses the S3 ETag) a
+        job that is active or complete for the same input and outputs is
+        reused instead of submitting a new one.
+        """
+        if self.deduplicate(input_name, outputs, playlists, content_hash) is not None:
+            self.message = None
+            return
+
+        self.message = self.submit(input_name, outputs, playlists)
 
+
+    def deduplicate(self, input_name, outputs, playlists=None, content_hash=None):
+        """
+        Set ``fingerprint`` and ``duplicate_of``, the job that can be reused
+        for this input and outputs if any, and return ``duplicate_of``
+        """
+        self.fingerprint = ''
+        self.duplicate_of = None
+
+        if content_hash is None and getattr(settings, 'ELASTIC_TRANSCODER_DEDUPLICATE', False):
+            content_hash = self.get_content_hash(input_name)
+
+        if content_hash:
+            self.fingerprint = fingerprint(self.pipeline_id, content_hash, outputs, playlists)
+            self.duplicate_of = self.find_duplicate(self.fingerprint)
+        return self.duplicate_of
+
+
+    def build_job(self, obj, message):
+        job = EncodeJob()
+        job.id = message['Job']['Id']
+        job.content_type = ContentType.objects.get_for_model(obj)
+        job.object_id = obj.id
+        job.pipeline_id = self.pipeline_id
+
+        return job
+
+
+    def build_duplicate_job(self, obj, original):
         job = EncodeJob()
-        job.id = self.message['Job']['Id']
-        job.content_type = content_type
+        job.id = '%s-%s' % (original.id, uuid4().hex)
+        job.content_type = ContentType.objects.get_for_model(obj)
         job.object_id = obj.id
+        job.pipeline_id = original.pipeline_id
+        job.duplicate_of = original
+        job.state = original.state
+        job.message = original.message
+
+        return job
+
+
+    def create_job_for_object(self, obj):
+        if self.duplicate_of is not None:
+            job = self.build_duplicate_job(obj, self.duplicate_of)
+        else:
+            job = self.build_job(obj, self.message)
+        job.fingerprint = self.fingerprint
         job.save()
+        set_status([job])
         
         return job
+
+
+    def submit_many(self, items, max_workers=None):
+        """
+        Submit ``(key, input_name, outputs[, playlists])`` items concurrently,
+        returning a ``(key, message, error)`` tuple for each of them
+        """
+        items = list(items)
+        if not items:
+            return []
+
+        if max_workers is None:
+            max_workers = getattr(settings, 'ELASTIC_TRANSCODER_MAX_WORKERS', 8)
+
+        pool = ThreadPool(min(max_workers, len(items)))
+        try:
+            return pool.map(self._submit_item, items)
+        finally:
+            pool.close()
+            pool.join()
+
+
+    def encode_many(self, items, max_workers=None):
+        """
+        Submit ``(obj, input_name, outputs[, playlists])`` items concurrently and
+        save an ``EncodeJob`` for every accepted one with a single ``bulk_create``.
+
+        A failing item does not abort the batch, its exception is recorded on
+        the returned ``EncodeResult`` instead.
+        """
+        result = EncodeResult()
+
+        jobs = []
+        for obj, message, error in self.submit_many(items, max_workers):
+            if error is not None:
+                result.errors[obj] = error
+                continue
+
+            job = self.build_job(obj, message)
+            result.jobs[obj] = job
+            jobs.append(job)
+
+        if jobs:
+            EncodeJob.objects.bulk_create(jobs)
+            set_status(jobs)
+
+        return result
+
+
+    def enqueue(self, obj, input_name, outputs, playlists=None):
+        """
+        Record the job in the outbox instead of submitting it.
+
+        The row is written in the caller's transaction and submitted later
+        by the ``run_encode_worker`` management command, in the region of this
+        transcoder.  Credentials are not stored, so the worker submits with
+        AWS_ACCESS_KEY_ID and AWS_SECRET_ACCESS_KEY and transcoders with
+        other credentials cannot enqueue.
+        """
+        if (self.aws_access_key_id != getattr(settings, 'AWS_ACCESS_KEY_ID', None) or
+                self.aws_secret_access_key != getattr(settings, 'AWS_SECRET_ACCESS_KEY', None)):
+            raise ValueError('enqueue() requires the credentials of the settings module')
+
+        return EncodeRequest.objects.create(
+            content_type=ContentType.objects.get_for_model(obj),
+            object_id=obj.id,
+            pipeline_id=self.pipeline_id,
+            region=self.aws_region,
+            input=json.dumps(input_name),
+            outputs=json.dumps(outputs),
+            playlists=json.dumps(playlists) if playlists is not None else '',
+        )
+
+
+    def _submit_item(self, item):
+        obj, args = item[0], item[1:]
+        try:
+            return obj, self.submit(*args), None
+        except Exception as e:
+            return obj, None, e
+
+
+# runs the AWS requests of ``AsyncTranscoder``
+executor = SharedPool('ELASTIC_TRANSCODER_ASYNC_WORKERS', 8)
+
+
+class Done(object):
+    """
+    Result of an ``AsyncTranscoder.encode()`` that had nothing to submit
+    """
+    def __init__(self, value):
+        self.value = value
+
+    def ready(self):
+        return True
+
+    def get(self, timeout=None):
+        return self.value
+
+
+class AsyncTranscoder(Transcoder):
+    """
+    ``Transcoder`` whose ``encode()`` returns straight away.
+
+    The ``create_job`` request runs on the shared executor while the caller
+    carries on; ``message`` (and so ``create_job_for_object()``) waits for the
+    response.  Database writes stay on the calling thread.
+    """
+    timeout = None
+
+    def encode(self, input_name, outputs, playlists=None, content_hash=None):
+        # the duplicate lookup reads the database, it stays on this thread
+        if self.deduplicate(input_name, outputs, playlists, content_hash) is not None:
+            self.pending = Done(None)
+        else:
+            self.pending = executor.apply_async(self.submit, (input_name, outputs, playlists))
+        return self.pending
+
+
+    def ready(self):
+        return self.pending.ready()
+
+
+    def wait(self, timeout=None):
+        if timeout is None:
+            timeout = self.timeout
+        if timeout is None:
+            timeout = getattr(settings, 'ELASTIC_TRANSCODER_ASYNC_TIMEOUT', 60)
+        return self.pending.get(timeout)
+
+
+    @property
+    def message(self):
+        return self.wait()
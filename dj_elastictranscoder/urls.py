@@ -2,4 +2,5 @@ from django.conf.urls import url, patterns
 
 urlpatterns = patterns('dj_elastictranscoder.views',
     url(r'^endpoint/$', 'endpoint', name="elastic-transcoder-endpoint"),
+    url(r'^endpoint/deferred/$', 'endpoint_deferred', name="elastic-transcoder-endpoint-deferred"),
 )
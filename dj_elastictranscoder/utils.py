@@ -0,0 +1,102 @@
+import atexit
+import threading
+from collections import OrderedDict
+from multiprocessing.pool import ThreadPool
+
+from django.conf import settings
+
+
+class LRUCache(object):
+    """
+    Thread safe dict holding at most ``maxsize`` items, dropping the least
+    recently used one first
+    """
+    def __init__(self, maxsize=128):
+        self.maxsize = maxsize
+        self.items = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, key, default=None):
+        with self.lock:
+            try:
+                value = self.items.pop(key)
+            except KeyError:
+                return default
+            self.items[key] = value
+            return value
+
+    def set(self, key, value):
+        with self.lock:
+            self.items.pop(key, None)
+            self.items[key] = value
+            while len(self.items) > self.maxsize:
+                self.items.popitem(last=False)
+
+    def __contains__(self, key):
+        return key in self.items
+
+    def __len__(self):
+        return len(self.items)
+
+    def clear(self):
+        with self.lock:
+            self.items.clear()
+
+
+class SharedPool(object):
+    """
+    Process wide thread pool of ``setting`` threads (``default`` when not
+    set), started on first use and drained when the process exits.
+
+    ``defer()`` queues at most ``queue_setting`` calls (``queue_default``
+    when not set) at a time.
+    """
+    def __init__(self, setting, default, queue_setting=None, queue_default=None):
+        self.setting = setting
+        self.default = default
+        self.queue_setting = queue_setting
+        self.queue_default = queue_default
+        self.pool = None
+        self.queued = 0
+        self.lock = threading.Lock()
+        atexit.register(self.close)
+
+    def get(self):
+        with self.lock:
+            if self.pool is None:
+                self.pool = ThreadPool(getattr(settings, self.setting, self.default))
+            return self.pool
+
+    def apply_async(self, func, args=()):
+        return self.get().apply_async(func, args)
+
+    def defer(self, func, *args):
+        """
+        Queue ``func`` unless the queue is full, returning whether it was queued
+        """
+        with self.lock:
+            if self.queue_setting is not None and self.queued >= getattr(
+                    settings, self.queue_setting, self.queue_default):
+                return False
+            self.queued += 1
+
+        self.get().apply_async(self.run, (func, args))
+        return True
+
+    def run(self, func, args):
+        try:
+            func(*args)
+        finally:
+            with self.lock:
+                self.queued -= 1
+
+    def close(self):
+        """
+        Wait for the queued calls to finish and stop the pool
+        """
+        with self.lock:
+            pool, self.pool = self.pool, None
+
+        if pool is not None:
+            pool.close()
+            pool.join()
@@ -1,21 +1,130 @@
 import json
 import logging
 
-from django.http import HttpResponse, HttpResponseBadRequest
+from django.conf import settings
+from django.db import connection, transaction
+from django.http import HttpResponse, HttpResponseBadRequest, HttpResponseForbidden
 from django.views.decorators.csrf import csrf_exempt
-from django.core.mail import mail_admins
-from urllib2 import urlopen
 
-from .models import EncodeJob
-from .signals import (
-    transcode_onprogress,
-    transcode_onerror,
-    transcode_oncomplete
-)
+from .admission import admission_control
+from .confirmations import add_confirmation
+from .models import ArchivedNotification, BufferedNotification
+from .notifications import apply_notification, is_job_notification, process_once
+from .signatures import SignatureError, verify
+from .utils import SharedPool
 
 logger = logging.getLogger("dj_elastictranscoder.views")
 
+
+def handle_notification(data, message):
+    # in buffered mode the notification is applied by flush_encoder_notifications
+    if getattr(settings, 'ELASTIC_TRANSCODER_NOTIFICATION_MODE', 'sync') == 'buffered':
+        if not is_job_notification(message):
+            logger.warning("Ignored SNS message that is not a job notification: '%s'" % data['Message'])
+            return
+        BufferedNotification.objects.create(message=data['Message'])
+    else:
+        apply_notification(message)
+
+
+def process_message(data):
+    """
+    Handle a decoded (and verified) SNS message, returning the response text
+    """
+    # handle SNS subscription
+    if data['Type'] == 'SubscriptionConfirmation':
+        add_confirmation(data)
+        return 'OK'
+
+    message_id = data.get('MessageId')
+    if getattr(settings, 'ELASTIC_TRANSCODER_ARCHIVE_NOTIFICATIONS', False):
+        ArchivedNotification.objects.create(message_id=message_id or '', message=data['Message'])
+
+    try:
+        message = json.loads(data['Message'])
+    except ValueError:
+        assert False, data['Message']
+
+    if message_id and getattr(settings, 'ELASTIC_TRANSCODER_DEDUPLICATE_NOTIFICATIONS', False):
+        process_once(message_id, handle_notification, data, message)
+    else:
+        handle_notification(data, message)
+
+    return 'Done'
+
+
+# applies the notifications of ``endpoint_deferred``
+executor = SharedPool('ELASTIC_TRANSCODER_ENDPOINT_WORKERS', 4, 'ELASTIC_TRANSCODER_ENDPOINT_QUEUE', 1000)
+
+
+def apply_buffered(pk, message_id, message):
+    """
+    Apply a notification stored by ``endpoint_deferred`` and delete its row.
+    The row is left to ``flush_encoder_notifications`` when this fails.
+    """
+    def apply():
+        apply_notification(message)
+        BufferedNotification.objects.filter(pk=pk).delete()
+
+    try:
+        with transaction.atomic():
+            if message_id and getattr(settings, 'ELASTIC_TRANSCODER_DEDUPLICATE_NOTIFICATIONS', False):
+                if not process_once(message_id, apply):
+                    BufferedNotification.objects.filter(pk=pk).delete()
+            else:
+                apply()
+    except Exception as e:
+        logger.warning("'%s' exception was raised applying deferred notification %s, "
+                       "left to flush_encoder_notifications: %s" % (e.__class__.__name__, pk, e))
+    finally:
+        connection.close()
+
+
 @csrf_exempt
+@admission_control
+def endpoint_deferred(request):
+    """
+    Receive SNS notification, answering as soon as the message is verified and
+    stored as a ``BufferedNotification``.  It is then applied on a pool of
+    ELASTIC_TRANSCODER_ENDPOINT_WORKERS threads; notifications that fail
+    there, were still queued when the process stopped or did not fit in the
+    queue are applied by ``flush_encoder_notifications``.
+    """
+    try:
+        data = json.loads(request.read())
+    except ValueError:
+        return HttpResponseBadRequest('Invalid JSON')
+
+    if getattr(settings, 'ELASTIC_TRANSCODER_VERIFY_SIGNATURES', False):
+        try:
+            verify(data)
+        except SignatureError as e:
+            logger.warning("Rejected SNS message: %s" % e)
+            return HttpResponseForbidden('Invalid signature')
+
+    if data.get('Type') == 'SubscriptionConfirmation':
+        add_confirmation(data)
+        return HttpResponse('OK')
+
+    message_id = data.get('MessageId')
+    if getattr(settings, 'ELASTIC_TRANSCODER_ARCHIVE_NOTIFICATIONS', False):
+        ArchivedNotification.objects.create(message_id=message_id or '', message=data['Message'])
+
+    try:
+        message = json.loads(data['Message'])
+    except (KeyError, ValueError):
+        message = None
+    if not is_job_notification(message):
+        logger.warning("Ignored SNS message that is not a job notification: '%s'" % data.get('Message'))
+        return HttpResponse('Ignored')
+
+    row = BufferedNotification.objects.create(message=data['Message'])
+    executor.defer(apply_buffered, row.pk, message_id, message)
+    return HttpResponse('Accepted')
+
+
+@csrf_exempt
+@admission_control
 def endpoint(request):
     """
     Receive SNS notification
@@ -27,59 +136,14 @@ def endpoint(request):
         except ValueError:
             return HttpResponseBadRequest('Invalid JSON')
     
-    
-        # handle SNS subscription
-        if data['Type'] == 'SubscriptionConfirmation':
-            subscribe_url = data['SubscribeURL']
-            
-            subscribe_body = """
-            This message serves as a fail-safe in case the automatic subscription confirmation fails. 
-            
-            Please visit this URL below to confirm your subscription with SNS
-    
-            %s """ % subscribe_url
-    
-            mail_admins('Please confirm SNS subscription', subscribe_body)
-            urlopen(subscribe_url)
-            return HttpResponse('OK')
-    
-        
-        #
-        try:
-            message = json.loads(data['Message'])
-        except ValueError:
-            assert False, data['Message']
-    
-        #
-        if message['state'] == 'PROGRESSING':
-            job = EncodeJob.objects.get(pk=message['jobId'])
-            job.message = 'Progress'
-            job.state = job.STATE_PROGRESSING
-            job.save()
-    
-            transcode_onprogress.send(sender=None, job=job, message=message)
-        elif message['state'] == 'COMPLETED':
-            job = EncodeJob.objects.get(pk=message['jobId'])
-            job.message = 'Success'
-            job.state = job.STATE_COMPLETE
-            job.save()
-    
-            transcode_oncomplete.send(sender=None, job=job, message=message)
-        elif message['state'] == 'ERROR':
-            job = EncodeJob.objects.get(pk=message['jobId'])
+        if getattr(settings, 'ELASTIC_TRANSCODER_VERIFY_SIGNATURES', False):
             try:
-                job.message = message['messageDetails']
-            except KeyError:
-                details = []
-                for output in message["outputs"]:
-                    details.append(output["statusDetail"])
-                job.message = json.dumps(details)
-            job.state = job.STATE_ERROR
-            job.save()
-    
-            transcode_onerror.send(sender=None, job=job, message=message)
+                verify(data)
+            except SignatureError, e:
+                logger.warning("Rejected SNS message: %s" % e)
+                return HttpResponseForbidden('Invalid signature')
     
-        return HttpResponse('Done')
+        return HttpResponse(process_message(data))
     except Exception, e:
         logger.exception("'%s' exception was raised processing the endpoint view. Posted data was as follows: '%s'" % (e.__class__.__name__, request_data))
         raise
\ No newline at end of file
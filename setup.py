@@ -19,6 +19,9 @@ setup(
         "django >= 1.7",
         "boto >= 2.5",
     ],
+    extras_require = {
+        "signatures": ["cryptography"],
+    },
     classifiers=[
         "Intended Audience :: Developers",
         "Operating System :: OS Independent",